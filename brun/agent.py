@@ -0,0 +1,170 @@
+import os
+import hmac
+import json
+import time
+import signal
+import socket
+import argparse
+import subprocess
+
+from threading import Thread, Event, Semaphore
+
+from . import brlogger, brconsole
+from .main import _SPAWN_KWARGS
+from .utils import Pool, killpg
+from .utils.remote import parse_address, read_token, send
+from .constants import *
+
+
+class Agent(object):
+    """
+    Runs the tasks received from a coordinating brun (see --agent) on a local pool.
+    Anyone who knows the token can run any command as the user of the agent.
+    """
+    def __init__(self, address, slots, token):
+        if not token:
+            raise ValueError('The agent requires a token (see --token-file)')
+        self.address = address
+        self.slots = slots
+        self.token = token
+        family, addr = parse_address(address)
+        if family == socket.AF_UNIX and os.path.exists(addr):
+            # left behind by an agent that did not exit cleanly
+            os.unlink(addr)
+        self.socket = socket.socket(family, socket.SOCK_STREAM)
+        if family == socket.AF_INET:
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.socket.bind(addr)
+        self.socket.listen()
+
+    """Serve one coordinator at a time, forever"""
+
+    def serve_forever(self):
+        while True:
+            conn, _ = self.socket.accept()
+            with conn:
+                self._serve(conn)
+
+    def _serve(self, conn):
+        lock = Semaphore(1)
+        reply = lambda message: send(conn, lock, message)
+        rfile = conn.makefile('rb')
+        if not self._authenticate(conn, rfile):
+            brlogger.warning('Refused a coordinator with an invalid token')
+            return
+        pool = Pool(self.slots, lambda *args, **kwargs: None)
+        pool.run()
+        reply({'type': 'hello', 'slots': self.slots})
+        brlogger.info('Serving a coordinator with {} slots'.format(self.slots))
+        stop = Event()
+        heartbeat = Thread(target=_heartbeat, args=(pool, reply, stop), daemon=True)
+        heartbeat.start()
+        try:
+            # the coordinator closes its end of the stream when it has no more tasks
+            for line in rfile:
+                message = json.loads(line.decode('utf-8'))
+                if message['type'] == 'task':
+                    pool.enqueue(_run_task, reply, message)
+        except (OSError, ValueError) as e:
+            brlogger.warning('Lost the coordinator. {}'.format(e))
+        finally:
+            # the tasks received are completed anyway
+            pool.shutdown()
+            stop.set()
+            heartbeat.join()
+        stats = pool.get_stats()
+        brlogger.info('Completed {} tasks, {} failed'.format(stats['tasks_completed'],
+                                                             stats['tasks_failed']))
+
+    def _authenticate(self, conn, rfile):
+        # the first message of a coordinator carries the token
+        conn.settimeout(AGENT_TIMEOUT_SECS)
+        try:
+            message = json.loads(rfile.readline().decode('utf-8'))
+            token = message.get('token') if message.get('type') == 'auth' else None
+        except (OSError, ValueError, AttributeError):
+            return False
+        conn.settimeout(None)
+        return isinstance(token, str) and hmac.compare_digest(token, self.token)
+
+
+def _run_task(reply, message):
+    cmd = message['cmd']
+    started = time.time()
+    timed_out = False
+    try:
+        task = subprocess.Popen(' '.join(cmd) if message['shell'] else cmd,
+                                shell=message['shell'],
+                                stdin=subprocess.DEVNULL,
+                                stdout=subprocess.PIPE,
+                                stderr=subprocess.PIPE,
+                                **_SPAWN_KWARGS)
+        try:
+            stdout, stderr = task.communicate(timeout=message['timeout'])
+        except subprocess.TimeoutExpired:
+            # SIGTERM first, then SIGKILL (to the whole process group)
+            timed_out = True
+            killpg(task.pid, signal.SIGTERM)
+            try:
+                stdout, stderr = task.communicate(timeout=message['grace'])
+            except subprocess.TimeoutExpired:
+                killpg(task.pid, signal.SIGKILL)
+                stdout, stderr = task.communicate()
+        returncode = task.returncode
+        stdout = stdout.decode('utf-8', errors='replace')
+        stderr = stderr.decode('utf-8', errors='replace')
+    except OSError as e:
+        # the executable could not be found or run
+        returncode, stdout, stderr = 127, '', str(e)
+    duration = time.time() - started
+    try:
+        reply({
+            'type': 'result',
+            'id': message['id'],
+            'returncode': returncode,
+            'stdout': stdout,
+            'stderr': stderr,
+            'duration': duration,
+            'timed_out': timed_out
+        })
+    except OSError:
+        # the coordinator is gone
+        pass
+
+
+def _heartbeat(pool, reply, stop):
+    while not stop.wait(AGENT_HEARTBEAT_SECS):
+        try:
+            reply({'type': 'heartbeat', 'stats': dict(pool.get_stats())})
+        except OSError:
+            return
+
+
+def run():
+    parser = argparse.ArgumentParser(description='Run the tasks sent by brun --agent')
+    parser.add_argument('-P',
+                        '--parallel',
+                        default=NUMBER_OF_CORES,
+                        type=int,
+                        help="Number of tasks to run at the same time. " +
+                        "Default is the number of cores")
+    parser.add_argument('--token-file',
+                        default=None,
+                        help="File containing the token that brun must present, the " +
+                        "default is the value of ${}".format(AGENT_TOKEN_ENV))
+    parser.add_argument('address',
+                        help="Address to listen on ('host:port' or 'unix:path'). " +
+                        "An empty host (':port') means 127.0.0.1")
+    parsed = parser.parse_args()
+    brconsole.set_show_status(False)
+    try:
+        token = read_token(parsed.token_file)
+        agent = Agent(parsed.address, max(1, parsed.parallel), token)
+    except (OSError, ValueError) as e:
+        brlogger.error(str(e))
+        exit(-1)
+    brlogger.info('Listening on {}'.format(parsed.address))
+    try:
+        agent.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -4,7 +4,7 @@ import argparse
 
 from .main import Brun
 from . import brlogger, __version__
-from .constants import DEFAULT_COMBINATOR, NUMBER_OF_CORES
+from .constants import DEFAULT_COMBINATOR, NUMBER_OF_CORES, TIMEOUT_GRACE_SECS, AGENT_TOKEN_ENV
 
 
 def run():
@@ -53,6 +53,34 @@ def get_parser():
                         type=int,
                         help="Force how many commands can run in parallel " +
                              "(unbounded)")
+    parser.add_argument('--load-max',
+                        default=None,
+                        type=float,
+                        help="Adapt the number of parallel commands at runtime so that the " +
+                             "load average of the machine stays below this value. " +
+                             "The number of parallel commands never exceeds -p/-P")
+    parser.add_argument('--mem-free-min',
+                        default=None,
+                        type=float,
+                        help="Adapt the number of parallel commands at runtime so that the " +
+                             "available memory (in MB) stays above this value")
+    parser.add_argument('--backend',
+                        choices=['threads', 'asyncio'],
+                        default='threads',
+                        help="Execution backend. 'threads' uses one thread per parallel " +
+                             "command, 'asyncio' runs all the commands on a single event " +
+                             "loop and scales to thousands of parallel commands. " +
+                             "Default is 'threads'")
+    parser.add_argument('--agent',
+                        action='append',
+                        default=[],
+                        help="Run the commands on the brun-agent listening on this address " +
+                             "('host:port' or 'unix:path'), can be used multiple times. " +
+                             "Tasks go to the agents with the most free slots")
+    parser.add_argument('--agent-token-file',
+                        default=None,
+                        help="File containing the token shared with the agents, the " +
+                             "default is the value of ${}".format(AGENT_TOKEN_ENV))
     parser.add_argument('-i',
                         '--interactive',
                         action='store_true',
@@ -83,5 +111,120 @@ def get_parser():
                         action='store_true',
                         default=False,
                         help="Do not show the status bar")
+    parser.add_argument('-b',
+                        '--batch',
+                        const=0,
+                        default=None,
+                        action='store',
+                        nargs='?',
+                        type=int,
+                        help="Run up to N combinations with a single command. List " +
+                             "placeholders (e.g., {x...}) expand to the values of all the " +
+                             "combinations in the batch. Without N, batches are as large " +
+                             "as the maximum length of a command allows")
+    parser.add_argument('--shard',
+                        default=None,
+                        help="Run only the i-th of n shares of the combinations " +
+                             "(syntax: 'i/n', with 1 <= i <= n). Every instance of brun " +
+                             "given the same fields gets the same shares")
+    parser.add_argument('--shard-strategy',
+                        choices=['strided', 'block'],
+                        default='strided',
+                        help="'strided' runs every n-th combination, 'block' runs a " +
+                             "contiguous block of combinations. Default is 'strided'")
+    parser.add_argument('--history',
+                        default=None,
+                        help="Record the duration of the commands in this file and run the " +
+                             "combinations that took longest in previous runs first " +
+                             "(streamed fields, e.g. stdin, are run in the order they arrive)")
+    parser.add_argument('--report',
+                        default=None,
+                        help="Write the resources used by each command (wall and CPU time, " +
+                             "max RSS, block I/O, context switches) to this CSV file, " +
+                             "or JSON Lines if its name ends with .json or .jsonl. The max " +
+                             "RSS is empty for commands that used less memory than brun, the " +
+                             "kernel reports the peak RSS of brun for them")
+    parser.add_argument('--metrics-addr',
+                        default=None,
+                        help="Serve the stats of the run at /metrics in the Prometheus text " +
+                             "format on this address ('host:port' or 'unix:path')")
+    parser.add_argument('--timeout',
+                        default=None,
+                        help="Kill the commands that run longer than this number of " +
+                             "seconds. It can contain fields placeholders (e.g., '{t}'), " +
+                             "0 means no timeout")
+    parser.add_argument('--timeout-grace',
+                        default=TIMEOUT_GRACE_SECS,
+                        type=float,
+                        help="Commands that time out get SIGTERM first and SIGKILL after " +
+                             "this number of seconds. Default is {}".format(TIMEOUT_GRACE_SECS))
+    parser.add_argument('--speculate',
+                        default=None,
+                        type=float,
+                        help="Once all the commands were started, run a copy of the commands " +
+                             "that take longer than this multiple of the median duration on " +
+                             "the idle slots. The first copy to complete wins, the other one " +
+                             "is killed. Requires --idempotent")
+    parser.add_argument('--idempotent',
+                        action='store_true',
+                        default=False,
+                        help="The commands can be run more than once with the same result " +
+                             "(e.g., they do not append to files)")
+    parser.add_argument('--no-shell',
+                        action='store_true',
+                        default=False,
+                        help="Run the commands directly instead of through /bin/sh. " +
+                             "Each token of the command is passed as a single argument")
+    parser.add_argument('--coprocess',
+                        action='store_true',
+                        default=False,
+                        help="Each worker runs its commands in a long-lived shell instead " +
+                             "of starting a new shell for each command. The commands " +
+                             "run by a worker share the state of its shell (e.g., variables)")
+    parser.add_argument('-s',
+                        '--stream',
+                        action='store_true',
+                        default=False,
+                        help="Print the output of the commands line by line while they run")
+    parser.add_argument('--stream-prefix',
+                        default='',
+                        help="Prefix prepended to each line of output when --stream is used. " +
+                             "It can contain fields placeholders (e.g., '[{x}] ')")
+    parser.add_argument('-o',
+                        '--output-dir',
+                        default=None,
+                        help="Write the stdout and stderr of each command to files in this " +
+                             "directory instead of keeping them in memory")
+    parser.add_argument('--output-compress',
+                        action='store_true',
+                        default=False,
+                        help="Compress the files written to --output-dir using gzip")
+    parser.add_argument('--output-tail',
+                        default=20,
+                        type=int,
+                        help="Number of lines of stderr kept in memory for each command " +
+                             "when --output-dir is used. Default is 20")
+    parser.add_argument('--cache',
+                        default=None,
+                        help="Store the results of the successful commands in this directory " +
+                             "and replay them instead of running the same commands again")
+    parser.add_argument('--cache-size',
+                        default=1024,
+                        type=int,
+                        help="Maximum size (in MB) of the cache, the least recently used " +
+                             "results are evicted first. Default is 1024")
+    parser.add_argument('--input-field',
+                        action='append',
+                        default=[],
+                        help="Field whose values are paths to input files of the commands. " +
+                             "The content of these files is part of the key of the cache")
+    parser.add_argument('--journal',
+                        default=None,
+                        help="Append the combinations that complete (and their exit codes) " +
+                             "to this file, it can be used to resume an interrupted run")
+    parser.add_argument('--resume',
+                        default=None,
+                        help="Skip the combinations that succeeded according to this " +
+                             "journal. New entries are appended to it unless --journal is used")
     parser.add_argument('command', nargs='+')
     return parser
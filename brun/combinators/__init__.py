@@ -1,6 +1,6 @@
-from .cross import combine as combine_cross
-from .zip import combine as combine_zip
-from .zipl import combine as combine_zipl
+from .cross import combine as combine_cross, size as size_cross
+from .zip import combine as combine_zip, size as size_zip
+from .zipl import combine as combine_zipl, size as size_zipl
 
 _combinator_map = {
     'default': combine_cross,
@@ -9,6 +9,13 @@ _combinator_map = {
     'zipl': combine_zipl,
 }
 
+_combinator_size_map = {
+    'default': size_cross,
+    'cross': size_cross,
+    'zip': size_zip,
+    'zipl': size_zipl,
+}
+
 
 def _get_combinator(comb_name):
     if not comb_name in _combinator_map:
@@ -16,3 +23,11 @@ def _get_combinator(comb_name):
         raise ValueError(msg)
     # ---
     return _combinator_map[comb_name]
+
+
+def _get_combinator_size(comb_name):
+    if not comb_name in _combinator_size_map:
+        msg = 'Grouping strategy "{}" not found!'.format(comb_name)
+        raise ValueError(msg)
+    # ---
+    return _combinator_size_map[comb_name]
@@ -1,5 +1,8 @@
-import itertools
+def combine(lst1, lst2, _):
+    for e1 in lst1:
+        for e2 in lst2:
+            yield e1, e2
 
 
-def combine(lst1, lst2, _):
-    return itertools.product(lst1, lst2)
+def size(len1, len2, _):
+    return len1 * len2
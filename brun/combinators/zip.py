@@ -2,7 +2,10 @@ from brun import brlogger
 
 
 def combine(lst1, lst2, _):
-    if len(lst1) != len(lst2):
-        brlogger.warning('Zipping two sets of different sizes {} != {}'.format(
-            len(lst1), len(lst2)))
     return zip(lst1, lst2)
+
+
+def size(len1, len2, _):
+    if len1 != len2:
+        brlogger.warning('Zipping two sets of different sizes {} != {}'.format(len1, len2))
+    return min(len1, len2)
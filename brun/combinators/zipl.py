@@ -2,8 +2,17 @@ import itertools
 
 
 def combine(lst1, lst2, args):
-    if len(args) != 1:
+    fill = _get_fill(args)
+    return itertools.zip_longest(lst1, lst2, fillvalue=fill)
+
+
+def size(len1, len2, args):
+    _get_fill(args)
+    return max(len1, len2)
+
+
+def _get_fill(args):
+    if not args or len(args) != 1:
         msg = 'The grouping strategy "zipl" requires a fill argument'
         raise ValueError(msg)
-    fill = args[0]
-    return itertools.zip_longest(lst1, lst2, fillvalue=fill)
+    return args[0]
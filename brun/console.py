@@ -2,12 +2,15 @@ import os
 import io
 import sys
 import time
+import atexit
 import logging
 import threading
 
 from collections import defaultdict
 
-from queue import Queue
+from queue import Queue, Empty
+
+from .constants import CONSOLE_MAX_FPS
 
 
 def restrict_console_access(logger):
@@ -37,10 +40,16 @@ class ProxyStream(io.TextIOWrapper):
 
 
 class Console():
-    def __init__(self):
+    """
+    Writes the log lines and redraws the status bar. Both are rendered by a dedicated thread
+    at most `max_fps` times per second, all the lines written since the last frame are
+    written at once. The status bar (and the ANSI escapes) are used only on terminals.
+    """
+    def __init__(self, max_fps=CONSOLE_MAX_FPS):
         # redirect stdout to buffer
         self.start_time = time.time()
         self.stdout = sys.stdout
+        self.tty = self.stdout.isatty()
         self.buffer = Queue()
         self.lock = threading.Semaphore(1)
         self.progress = defaultdict(lambda: 0)
@@ -48,6 +57,12 @@ class Console():
         self.delete_last = False
         self.show_status = None
         self.plain_console = False
+        self.frame_time = 1.0 / max_fps
+        self.dirty = threading.Event()
+        self.renderer = None
+        self.closed = False
+        # lines written right before exiting are not lost
+        atexit.register(self.close)
 
     def set_progress(self, progress):
         self.progress.update(progress)
@@ -64,52 +79,70 @@ class Console():
         self.plain_console = val
 
     def write(self, msg):
-        # get the lock
-        self.lock.acquire()
         # write to buffer
         self.buffer.put(msg)
-        # release the lock
-        self.lock.release()
+
+    """Request a new frame, the renderer draws it as soon as the frame rate allows"""
 
     def flush(self):
-        # get the lock
-        self.lock.acquire()
-        # clear last line
-        self._clear_status_bar()
-        # dump buffer content on the console
-        while not self.buffer.empty():
-            line = self.buffer.get()
-            self.stdout.write(line + "\033[K")
-        # print separator then status bar
-        self._print_status_bar()
-        # flush stdout
-        self.stdout.flush()
-        # release the lock
-        self.lock.release()
+        if self.closed:
+            self._render()
+            return
+        if self.renderer is None:
+            self.renderer = threading.Thread(target=self._render_loop, daemon=True)
+            self.renderer.start()
+        self.dirty.set()
 
     def close(self):
         self.set_show_status(False)
-        # clear status (if any)
-        self._clear_status_bar()
-
-    def _clear_status_bar(self):
+        if not self.closed:
+            self.closed = True
+            self.dirty.set()
+            if self.renderer is not None:
+                self.renderer.join()
+        # render what is left and clear status (if any)
+        self._render()
+
+    def _render_loop(self):
+        while not self.closed:
+            self.dirty.wait()
+            self.dirty.clear()
+            self._render()
+            # frames are not drawn more often than the frame rate allows
+            time.sleep(self.frame_time)
+
+    def _render(self):
+        # get the lock
+        self.lock.acquire()
+        frame = []
+        # clear last lines
         if self.delete_last and (not self.plain_console):
-            # clear 2 lines
-            self.stdout.write("\033[F\033[K" * 2)
+            frame.append("\033[F\033[K" * 2)
             self.delete_last = False
-            # flush stdout
-            self.stdout.flush()
-
-    def _print_status_bar(self):
-        if self.show_status and self.has_progress:
-            self.stdout.write(("-" * 80) + "\n")
-            self.stdout.write(self._get_status_bar() + "\n")
+        # dump buffer content
+        while True:
+            try:
+                line = self.buffer.get_nowait()
+            except Empty:
+                break
+            frame.append(line + ("\033[K" if self.tty else ""))
+        # print separator then status bar
+        if self.show_status and self.has_progress and self.tty:
+            frame.append(("-" * 80) + "\n")
+            frame.append(self._get_status_bar() + "\n")
             self.delete_last = True
-            # flush stdout
+        # a single write per frame
+        if frame:
+            self.stdout.write(''.join(frame))
             self.stdout.flush()
+        # release the lock
+        self.lock.release()
 
     def _get_status_bar(self):
-        return "[brun {:.1f} s] [{:s}] [{:d}/{:d} complete] [{:d}/{:d} jobs] [{:d} queued] [{:d} aborted] [{:d} failed]".format(
+        template = "[brun {:.1f} s] [{:s}] [{:d}/{:d} complete] [{:d}/{:d} jobs] " + \
+                   "[{:d} queued] [{:d} aborted] [{:d} failed] [{:.1f} tasks/s] " + \
+                   "[mean {:.2f} s, p95 {:.2f} s] [ETA {:s}]"
+        return template.format(
             self.uptime(),
             str(self.progress['app_status']),
             self.progress['tasks_completed'],
@@ -119,4 +152,19 @@ class Console():
             self.progress['tasks_queued'],
             self.progress['tasks_aborted'],
             self.progress['tasks_failed'],
+            self.progress['tasks_rate'],
+            self.progress['task_duration_mean'],
+            self.progress['task_duration_p95'],
+            _format_duration(self.progress['eta']),
         )
+
+
+def _format_duration(secs):
+    if secs is None:
+        return '--'
+    secs = int(round(secs))
+    if secs >= 3600:
+        return '{:d}h{:02d}m'.format(secs // 3600, secs % 3600 // 60)
+    if secs >= 60:
+        return '{:d}m{:02d}s'.format(secs // 60, secs % 60)
+    return '{:d}s'.format(secs)
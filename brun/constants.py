@@ -13,6 +13,11 @@ PARALLEL_TO_START_PROMPT_STRING = {True: ':brun: Starting > {0}', False: ':brun:
 
 PARALLEL_TO_FAILURE_PROMPT_STRING = {True: ':brun: Failed < {0}', False: ':brun:< {0}\n\n\n'}
 
+PARALLEL_TO_TIMEOUT_PROMPT_STRING = {
+    True: ':brun: Timed out < {0}',
+    False: ':brun:< {0} (timed out)\n\n\n'
+}
+
 PARALLEL_TO_END_PROMPT_STRING = {True: ':brun: Finished < {0}', False: ':brun:< {0}\n\n\n'}
 
 TASK_OUTPUT_TEMPLATE = (b"""
@@ -32,3 +37,42 @@ DEFAULT_FIELD = ('_builtin_field', 'json', '.brun')
 ESCALATE_TO_KILL_AFTER_SECS = 10
 
 APP_HEARTBEAT_HZ = 10
+
+DISPATCH_QUEUE_SLOTS_PER_WORKER = 2
+
+READ_CHUNK_SIZE = 64 * 1024
+
+DEFAULT_ARG_MAX = 128 * 1024
+
+MAX_ARG_STRLEN = 128 * 1024
+
+ARG_MAX_HEADROOM = 2048
+
+MAX_OPEN_BATCHES = 1024
+
+JOURNAL_SYNC_INTERVAL_SECS = 1.0
+
+AGENT_HEARTBEAT_SECS = 1.0
+
+AGENT_TIMEOUT_SECS = 10.0
+
+# environment variable holding the token shared by brun and its agents
+AGENT_TOKEN_ENV = 'BRUN_AGENT_TOKEN'
+
+HISTORY_EMA_ALPHA = 0.3
+
+# combinations reordered together, per slot (the first ones wait for the whole window)
+HISTORY_WINDOW_PER_SLOT = 64
+
+STATS_WINDOW_SECS = 30.0
+
+STATS_WINDOW_TASKS = 10000
+
+STATS_DURATION_BUCKETS = [0.1, 0.5, 1, 5, 10, 30, 60, 300, 1800, 3600]
+
+CONSOLE_MAX_FPS = 20
+
+TIMEOUT_GRACE_SECS = 5.0
+
+# how often the running tasks are checked for stragglers
+SPECULATE_INTERVAL_SECS = 0.5
@@ -13,3 +13,8 @@ class InvalidConfigurationError(RuntimeError):
     def __init__(self, msg, data=None):
         self.data = data
         super(RuntimeError, self).__init__(msg)
+
+
+class TaskCancelledError(RuntimeError):
+    def __init__(self, msg):
+        super(RuntimeError, self).__init__(msg)
@@ -1,7 +1,13 @@
 import os
+import mmap
+
+from array import array
+from collections.abc import Sequence
 
 aliases = ['f']
 
+COUNT_CHUNK_SIZE = 1024 * 1024
+
 
 def generate(args):
     if len(args) != 1:
@@ -13,6 +19,65 @@ def generate(args):
         msg = 'The file "{}" does not exist.'.format(filepath)
         raise ValueError(msg)
     # ---
-    with open(filepath, 'rt') as fin:
-        lines = fin.readlines()
-        return [line.strip() for line in lines]
+    return FileLines(filepath)
+
+
+class FileLines(Sequence):
+    """
+    Lazy sequence of the (stripped) lines of a file.
+    The file is memory-mapped and lines are decoded only when accessed. The offsets of the
+    lines are indexed on the first random access, iterating does not need them.
+    """
+    def __init__(self, filepath, encoding='utf-8'):
+        self._encoding = encoding
+        self._mm = None
+        self._index = None
+        self._len = 0
+        with open(filepath, 'rb') as fin:
+            # empty files cannot be mapped
+            if os.fstat(fin.fileno()).st_size > 0:
+                self._mm = mmap.mmap(fin.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mm is not None:
+            size = len(self._mm)
+            for i in range(0, size, COUNT_CHUNK_SIZE):
+                self._len += self._mm[i:i + COUNT_CHUNK_SIZE].count(b'\n')
+            # the last line might not be terminated
+            if self._mm[size - 1:size] != b'\n':
+                self._len += 1
+
+    def __len__(self):
+        return self._len
+
+    def __iter__(self):
+        if self._mm is None:
+            return
+        start, size = 0, len(self._mm)
+        while start < size:
+            end = self._mm.find(b'\n', start)
+            end = size if end < 0 else end
+            yield self._decode(start, end)
+            start = end + 1
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return [self[i] for i in range(*key.indices(self._len))]
+        if key < 0:
+            key += self._len
+        if not 0 <= key < self._len:
+            raise IndexError('line index out of range')
+        if self._index is None:
+            self._index = self._build_index()
+        end = self._index[key + 1] if key + 1 < self._len else len(self._mm)
+        return self._decode(self._index[key], end)
+
+    def _decode(self, start, end):
+        return self._mm[start:end].decode(self._encoding).strip()
+
+    def _build_index(self):
+        index = array('Q', [0])
+        size = len(self._mm)
+        end = self._mm.find(b'\n')
+        while 0 <= end < size - 1:
+            index.append(end + 1)
+            end = self._mm.find(b'\n', end + 1)
+        return index
@@ -1,4 +1,8 @@
+import os
 import sys
+import codecs
+
+from brun.constants import READ_CHUNK_SIZE
 
 aliases = []
 
@@ -11,6 +15,37 @@ def generate(args):
     sep = '\n'
     if len(args) > 0:
         sep = args[0].strip()
-    values = [l.strip().replace('\n', ';') for l in sys.stdin.read().split(sep)]
     # ---
-    return list(filter(len, values))
+    return StdinStream(sys.stdin, sep)
+
+
+class StdinStream(object):
+    """
+    Single-pass iterable over the records of a text stream.
+    Records are yielded as soon as their delimiter is read, without waiting for EOF.
+    """
+    def __init__(self, stream, sep='\n'):
+        self._stream = stream
+        self._sep = sep
+
+    def __iter__(self):
+        for record in _read_records(self._stream, self._sep):
+            value = record.strip().replace('\n', ';')
+            if len(value):
+                yield value
+
+
+def _read_records(stream, sep):
+    fd = stream.fileno()
+    decoder = codecs.getincrementaldecoder(getattr(stream, 'encoding', None) or 'utf-8')()
+    buffer = ''
+    while True:
+        # returns as soon as some data is available
+        chunk = os.read(fd, READ_CHUNK_SIZE)
+        buffer += decoder.decode(chunk, final=not chunk)
+        *records, buffer = buffer.split(sep)
+        for record in records:
+            yield record
+        if not chunk:
+            break
+    yield buffer
@@ -1,18 +1,25 @@
 import os
 import re
-import itertools
-import networkx as nx
+
+from itertools import islice
+from collections import OrderedDict
+from collections.abc import Sized
 
 from . import brlogger
 from .exceptions import CLISyntaxError, InvalidConfigurationError
 from .generators import _get_generator
-from .combinators import _get_combinator
+from .combinators import _get_combinator, _get_combinator_size
 from .constants import *
 
+# placeholders that expand to the values of all the combinations in a batch, e.g., {x...}
+LIST_PLACEHOLDER = re.compile(r'\{(\w+)\.\.\.\}')
+
 
 class CommandConfig(object):
-    def __init__(self, dp_dict=None):
+    def __init__(self, dp_dict=None, id=None):
         self._data = dp_dict if dp_dict else dict()
+        # position of the combination in the configuration
+        self.id = id
 
     def set(self, key, value):
         self._data[key] = value
@@ -22,7 +29,7 @@ class CommandConfig(object):
 
     def apply(self, command):
         try:
-            return [c.format(**self._data) for c in command]
+            return [LIST_PLACEHOLDER.sub(r'{\1}', c).format(**self._data) for c in command]
         except KeyError as e:
             msg = 'The command contains a field {} that was not declared'.format(e)
         raise CLISyntaxError(msg)
@@ -31,6 +38,28 @@ class CommandConfig(object):
         return self._data.__str__()
 
 
+class BatchCommandConfig(CommandConfig):
+    """
+    Combinations run by a single command. Tokens containing list placeholders (e.g., {x...})
+    are repeated for each combination, the other tokens are the same for all of them.
+    """
+    def __init__(self, members):
+        super(BatchCommandConfig, self).__init__(members[0]._data, id=members[0].id)
+        self.members = members
+
+    def apply(self, command):
+        cmd = []
+        for c in command:
+            if LIST_PLACEHOLDER.search(c):
+                cmd += [m.apply([c])[0] for m in self.members]
+            else:
+                cmd += super(BatchCommandConfig, self).apply([c])
+        return cmd
+
+    def __str__(self):
+        return [m._data for m in self.members].__str__()
+
+
 class Config(object):
     def __init__(self, parsed):
         self._data = []
@@ -65,7 +94,7 @@ class Config(object):
                 self._fields[name] = values
         self._fields_keys = sorted(list(self._fields.keys()))
         # create fields graph
-        G = nx.Graph()
+        G = _FieldGraph()
         # add nodes
         G.add_nodes_from(self._fields_keys)
         brlogger.debug('Add nodes {}'.format(self._fields_keys))
@@ -77,36 +106,141 @@ class Config(object):
             for f0, f1 in zip(fields, fields[1:]):
                 brlogger.debug('Add edge. Type {} between fields ({}, {})'.format(type, f0, f1))
                 G.add_edge(f0, f1, type=type, args=combinator_args)
-        # make sure the graph is consistent
-        head, tail = _complete_graph(G)
-        if not head:
+        # make sure the graph is consistent and get the path through all the fields
+        path = _solve_graph(G)
+        if not path:
             return
-        # get path from head to tail
-        paths = list(nx.all_simple_paths(G, source=head, target=tail)) or [[head]]
-        if len(paths) > 1:
-            raise InvalidConfigurationError('The induced graph has more than one path')
-        self._fields_keys = paths[0]
-        # combine fields
-        data = [(v, ) for v in self._fields[self._fields_keys[0]]] if self._fields_keys else []
-        field_to_blob = {f: self._fields[f] for f in self._fields_keys}
+        self._fields_keys = _orient_path(path, G, self._fields)
+        # combine fields (lazily, combinations are generated while iterating)
+        data = _FieldData(self._fields[self._fields_keys[0]])
         for u, v in zip(self._fields_keys, self._fields_keys[1:]):
             combinator_data = G.get_edge_data(u, v)
-            combinator_args = combinator_data['args']
-            combinator = _get_combinator(combinator_data['type'])
-            blob0, blob1 = field_to_blob[u], field_to_blob[v]
-            data = field_to_blob[v] = _flatten_data(combinator(blob0, blob1, combinator_args))
+            data = _CombinedData(data, self._fields[v], combinator_data['type'],
+                                 combinator_data['args'])
+        self._data = data
+
+    def __iter__(self):
+        return self.select(slice(None))
+
+    def select(self, selection):
+        # the combinations left out of the slice are not turned into CommandConfigs
+        data = islice(enumerate(self._data), selection.start, selection.stop, selection.step)
         # turn data into CommandConfigs
-        for d in data:
+        for i, d in data:
             assert len(self._fields_keys) == len(d)
             cc_dict = {k: v for k, v in zip(self._fields_keys, d)}
-            cc = CommandConfig(cc_dict)
-            self._data.append(cc)
+            yield CommandConfig(cc_dict, id=i)
 
-    def __iter__(self):
-        return iter(self._data)
+    def fields(self):
+        return list(self._fields_keys)
 
     def __len__(self):
-        return len(self._data)
+        size = self.size()
+        if size is None:
+            raise TypeError('The size of a configuration with streamed fields is not known')
+        return size
+
+    def size(self):
+        """Number of combinations, None when a streamed field makes it unknown"""
+        return self._data.size() if self._data else 0
+
+
+class _FieldData(object):
+    """Stream of 1-tuples built on top of the values of the first field of the path"""
+    def __init__(self, values):
+        self._values = values
+
+    def __iter__(self):
+        return ((v, ) for v in self._values)
+
+    def size(self):
+        return len(self._values) if _is_sized(self._values) else None
+
+
+class _CombinedData(object):
+    """Stream of tuples obtained by combining a stream of tuples with the values of a field"""
+    def __init__(self, blob0, blob1, type, args):
+        self._blob0 = blob0
+        self._blob1 = blob1
+        self._args = args
+        self._combinator = _get_combinator(type)
+        # the size is computed once, from the sizes of the two operands
+        len0 = blob0.size()
+        len1 = len(blob1) if _is_sized(blob1) else None
+        self._len = None
+        if len0 is not None and len1 is not None:
+            self._len = _get_combinator_size(type)(len0, len1, args)
+
+    def __iter__(self):
+        return _flatten_data(self._combinator(self._blob0, self._blob1, self._args))
+
+    def size(self):
+        return self._len
+
+
+def batch(configs, command, size=None, shell=True):
+    """
+    Groups combinations into BatchCommandConfigs of at most `size` combinations.
+    Combinations in the same batch share the values of the fields that are not used in list
+    placeholders, and the resulting command always fits in the limits of the kernel.
+    """
+    list_fields = set(f for c in command for f in LIST_PLACEHOLDER.findall(c))
+    if not list_fields:
+        raise CLISyntaxError('Batching requires a list placeholder (e.g., {x...}) in the command')
+    fixed_command = [c for c in command if not LIST_PLACEHOLDER.search(c)]
+    list_command = [c for c in command if LIST_PLACEHOLDER.search(c)]
+    fixed_fields = sorted(set(re.findall(r'\{(\w+)', ' '.join(fixed_command))) - list_fields)
+    max_bytes = _get_max_command_bytes(shell)
+    # batches being filled, by values of the fixed fields (the oldest is sent when too many)
+    batches = OrderedDict()
+    for cc in configs:
+        key = tuple(cc.apply(['{%s}' % f for f in fixed_fields]))
+        cc_bytes = _command_bytes(cc.apply(list_command), shell)
+        if key in batches:
+            members, nbytes = batches[key]
+            if nbytes + cc_bytes > max_bytes or len(members) == size:
+                yield BatchCommandConfig(batches.pop(key)[0])
+        if key not in batches:
+            if len(batches) >= MAX_OPEN_BATCHES:
+                yield BatchCommandConfig(batches.popitem(last=False)[1][0])
+            batches[key] = [[], _command_bytes(cc.apply(fixed_command), shell)]
+        batches[key][0].append(cc)
+        batches[key][1] += cc_bytes
+    for members, _ in batches.values():
+        yield BatchCommandConfig(members)
+
+
+def shard(shard_str, strategy, size=None):
+    """Returns the slice of the combinations run by the shard 'i/n' (1 <= i <= n)"""
+    match = re.match(r'^(\d+)/(\d+)$', shard_str)
+    if not match or not 1 <= int(match.group(1)) <= int(match.group(2)):
+        msg = "Invalid shard '{}', the syntax is 'i/n' with 1 <= i <= n".format(shard_str)
+        raise CLISyntaxError(msg)
+    index, count = int(match.group(1)) - 1, int(match.group(2))
+    if strategy == 'strided':
+        # every n-th combination
+        return slice(index, None, count)
+    if size is None:
+        raise CLISyntaxError('The block strategy cannot be used with streamed fields, ' +
+                             'the number of combinations is not known')
+    # contiguous block of combinations
+    return slice(index * size // count, (index + 1) * size // count)
+
+
+def _command_bytes(tokens, shell):
+    # the shell receives a single string, argv entries also cost a pointer
+    return sum(len(t.encode('utf-8')) + 1 + (0 if shell else 8) for t in tokens)
+
+
+def _get_max_command_bytes(shell):
+    arg_max = os.sysconf('SC_ARG_MAX') if hasattr(os, 'sysconf') else DEFAULT_ARG_MAX
+    # the environment shares the same space
+    env_bytes = sum(len(k) + len(v) + 2 + 8 for k, v in os.environ.items())
+    max_bytes = arg_max - env_bytes - ARG_MAX_HEADROOM
+    # a single argument (e.g., the script given to the shell) has its own limit on Linux
+    if shell:
+        max_bytes = min(max_bytes, MAX_ARG_STRLEN - ARG_MAX_HEADROOM)
+    return max_bytes
 
 
 def _parse_field(field_str):
@@ -144,41 +278,115 @@ def _parse_group(group_str, declared_fields):
     return type, fields, combinator_args
 
 
+def _is_sized(values):
+    """Streamed fields (e.g., stdin) do not know their size and can be iterated only once"""
+    return isinstance(values, Sized)
+
+
+def _orient_path(path, G, fields):
+    """
+    Streamed fields can only be consumed once, so they cannot be the right-hand operand of
+    a cross product (which iterates it once for every value on the left-hand side).
+    Returns the path or its reverse, whichever satisfies this constraint.
+    """
+    def _valid(p):
+        for u, v in zip(p, p[1:]):
+            if not _is_sized(fields[v]) and G.get_edge_data(u, v)['type'] in ['cross', 'default']:
+                return False
+        return True
+
+    for p in [path, path[::-1]]:
+        if _valid(p):
+            return p
+    streamed = [f for f in path if not _is_sized(fields[f])]
+    msg = 'Invalid grouping. The streamed fields {} can only be crossed '.format(streamed) + \
+          'from the head of the chain of fields'
+    raise InvalidConfigurationError(msg, data=set(streamed))
+
+
 def _flatten_data(blob):
-    nblob = []
     for e in blob:
         if isinstance(e, (tuple, list)) and isinstance(e[0], (tuple, list)):
-            nblob.append(e[0] + (e[1], ))
+            yield e[0] + (e[1], )
         else:
-            nblob.append(e)
-    return nblob
+            yield e
+
+
+class _FieldGraph(object):
+    """Undirected graph of the fields, the edges hold the type and the args of the groups"""
+    def __init__(self):
+        # node -> {neighbor: edge data}, the nodes keep the order they were added in
+        self._adj = OrderedDict()
+
+    @property
+    def nodes(self):
+        return list(self._adj.keys())
+
+    def add_node(self, u):
+        self._adj.setdefault(u, OrderedDict())
+
+    def add_nodes_from(self, nodes):
+        for u in nodes:
+            self.add_node(u)
+
+    def add_edge(self, u, v, **data):
+        self.add_node(u)
+        self.add_node(v)
+        self._adj[u][v] = self._adj[v][u] = data
+
+    def get_edge_data(self, u, v):
+        return self._adj[u].get(v)
+
+    def neighbors(self, u):
+        return iter(self._adj[u])
+
+    def degree(self, u):
+        return len(self._adj[u])
+
+    def components(self):
+        """Connected components, as lists of nodes in the order they are reached"""
+        seen = set()
+        for root in self._adj:
+            if root in seen:
+                continue
+            seen.add(root)
+            component, stack = [], [root]
+            while stack:
+                u = stack.pop()
+                component.append(u)
+                for v in self._adj[u]:
+                    if v not in seen:
+                        seen.add(v)
+                        stack.append(v)
+            yield component
 
 
-def _complete_graph(G, default_comb=DEFAULT_COMBINATOR):
+def _solve_graph(G, default_comb=DEFAULT_COMBINATOR):
     """
     The given groups have added edges to the graph to form several connected components.
     A graph is valid iff all connected components are valid.
     A connected component is valid iff:
         - it has n vertices and exactly n-1 edges
         - the degree of each node is either 1 or 2
+    so each of them is a chain of fields. The chains are joined end to end with the default
+    combinator, in the order of their first node. Returns the path through all the nodes.
     """
-    cc = [G.subgraph(c).copy() for c in nx.connected_components(G)]
-    cc_degree = [G1.degree() for G1 in cc]
-    unitary_nodes = []
-    for G1, degree in zip(cc, cc_degree):
+    path = []
+    order = {u: i for i, u in enumerate(G.nodes)}
+    for component in G.components():
         msg = 'Invalid grouping. No loops of forks are allowed. ' + \
-              'Invalid grouping found between the fields: {}'.format(G1.nodes)
-        e = InvalidConfigurationError(msg, data=set(G1.nodes))
-        # check if this connected component is valid
-        if G1.number_of_edges() != G1.number_of_nodes() - 1:
+              'Invalid grouping found between the fields: {}'.format(component)
+        e = InvalidConfigurationError(msg, data=set(component))
+        degrees = [G.degree(u) for u in component]
+        if sum(degrees) != 2 * (len(component) - 1) or max(degrees) > 2:
             raise e
-        for _, d in degree:
-            if d not in [0, 1, 2]:
-                raise e
-        ends = [n for n, d in degree if d in [0, 1]]
-        unitary_nodes += ends if len(ends) > 1 else 2 * [ends[0]]
-    # all the connected components are valid, add missing edges
-    for n0, n1 in zip(unitary_nodes[1:-2], unitary_nodes[2:-1]):
-        G.add_edge(n0, n1, type=default_comb, args=None)
-    # return head, tail
-    return (unitary_nodes[0], unitary_nodes[-1]) if len(unitary_nodes) else (None, None)
+        # walk the chain from the first of its ends
+        u = min([u for u in component if G.degree(u) < 2], key=order.get)
+        chain, previous = [u], None
+        while len(chain) < len(component):
+            u, previous = next(v for v in G.neighbors(u) if v != previous), u
+            chain.append(u)
+        if path:
+            G.add_edge(path[-1], chain[0], type=default_comb, args=None)
+        path += chain
+    return path
@@ -32,5 +32,5 @@ class BrLogger(logging.Logger):
             out = '{}:{}{}'.format(logging._levelToName[lvl], pre, msg)
         # add message to buffer
         self.console.write(out)
-        # force flush
+        # request a new frame (the console renders it on its own thread)
         self.console.flush()
@@ -1,19 +1,32 @@
+import os
 import sys
 import time
 import types
 import signal
+import resource
 import logging
 import subprocess
 
 from enum import Enum
-from threading import Timer
+from threading import Thread, Timer, Semaphore, local
 
 from . import brlogger, brconsole
-from .lib import Config, CLISyntaxError
-from .utils import Pool
+from .lib import Config, CLISyntaxError, batch, shard
+from .utils import Pool, OutputSpool, ConcurrencyController, ShellCoprocess, \
+    ResultCache, Journal, RemotePool, RuntimeHistory, TaskReport, Watchdog, Speculator, killpg
+from .utils.remote import read_token
 from .constants import *
 from .console import restrict_console_access
-from .exceptions import TaskFailureError
+from .exceptions import TaskFailureError, TaskCancelledError
+
+# tasks run in their own process group so that Ctrl+C (sent by the terminal to the foreground
+# process group) does not reach them. Unlike a preexec_fn, no Python code runs in the child,
+# which lets CPython use vfork and keeps the spawn cost independent of the memory of brun.
+# A background process group that reads from the terminal is stopped (SIGTTIN), and stdin
+# may be the source of a field, so tasks never inherit the stdin of brun (the commands run
+# by a coprocess get /dev/null from its shell)
+_SPAWN_KWARGS = {'process_group': 0} if sys.version_info >= (3, 11) else \
+    {'start_new_session': True}
 
 
 class AppStatus(Enum):
@@ -62,6 +75,19 @@ class Brun():
         except Exception as e:
             brlogger.error(str(e))
             exit(-2)
+        self.batched = self.args.batch is not None
+        # run only a share of the combinations (e.g., one of several machines)
+        self.shard = slice(None)
+        if self.args.shard:
+            try:
+                self.shard = shard(self.args.shard, self.args.shard_strategy, self.config.size())
+            except CLISyntaxError as e:
+                brlogger.error(str(e))
+                exit(-1)
+        # number of combinations to run (unknown when fields are streamed)
+        self.size = None
+        if self.config.size() is not None:
+            self.size = len(range(self.config.size())[self.shard])
         # define number of workers
         num_workers = 1
         # parallel (bounded to number of cores)
@@ -70,23 +96,146 @@ class Brun():
         # parallel (unbounded)
         if self.args.force_parallel > 0:
             num_workers = self.args.force_parallel
-        # do not spin more workers than needed
-        num_workers = min(num_workers, len(self.config))
+        # do not spin more workers than needed (the size of streamed configs is unknown)
+        if self.size is not None:
+            num_workers = min(num_workers, self.size)
         # parallel execution "is a thing" when you need at least 2 workers
         self.is_parallel = num_workers > 1
-        # create workers pool
-        self.pool = Pool(num_workers, self._exception_handler)
+        # spool the output of the tasks to files
+        self.spool = None
+        if self.args.output_dir:
+            self.spool = OutputSpool(self.args.output_dir, self.args.output_compress,
+                                     self.args.output_tail)
+        # replay the results of the commands that already ran with the same inputs
+        self.cache = None
+        if self.args.cache:
+            for name in self.args.input_field:
+                if name not in self.config.fields():
+                    brlogger.error('The input field {} was not declared'.format(name))
+                    exit(-1)
+            self.cache = ResultCache(self.args.cache, self.args.cache_size * 1024 * 1024)
+        # record the completed combinations, skip the ones that succeeded in a previous run
+        self.journal = None
+        self.resumed = set()
+        if self.args.resume:
+            try:
+                self.resumed = Journal.load(self.args.resume)
+            except (OSError, KeyError) as e:
+                brlogger.error('The journal {} cannot be read. {}'.format(self.args.resume, e))
+                exit(-1)
+        if self.args.journal or self.args.resume:
+            self.journal = Journal(self.args.journal or self.args.resume,
+                                   JOURNAL_SYNC_INTERVAL_SECS)
+        # resources used by each task
+        self.report = None
+        if self.args.report:
+            try:
+                self.report = TaskReport(self.args.report, self.config.fields())
+            except OSError as e:
+                brlogger.error('The report {} cannot be written. {}'.format(self.args.report, e))
+                exit(-1)
+        # durations measured in previous runs, the longest combinations run first
+        self.history = None
+        if self.args.history:
+            try:
+                self.history = RuntimeHistory(self.args.history, ' '.join(self.args.command),
+                                              HISTORY_EMA_ALPHA)
+            except (OSError, ValueError) as e:
+                brlogger.error('The history {} cannot be read. {}'.format(self.args.history, e))
+                exit(-1)
+        # each worker can keep a shell alive and use it to run its commands
+        if self.args.coprocess and (self.args.no_shell or self.args.backend != 'threads'):
+            brlogger.error('The argument --coprocess requires a shell and the threads backend')
+            exit(-1)
+        # the tasks are run by remote agents (not needed for dry runs)
+        remote = len(self.args.agent) > 0 and not self.args.dry_run
+        if self.args.speculate is not None:
+            if not self.args.idempotent:
+                brlogger.error('The argument --speculate requires --idempotent')
+                exit(-1)
+            # each copy of a task runs in its own process, its output is kept in memory
+            if remote or self.args.backend != 'threads' or self.args.coprocess or \
+                    self.args.stream or self.args.output_dir:
+                brlogger.error('The argument --speculate requires the threads backend and ' +
+                               'cannot be used with --agent, --coprocess, --stream or ' +
+                               '--output-dir')
+                exit(-1)
+        if remote and (self.args.coprocess or self.cache):
+            brlogger.error('The arguments --coprocess and --cache cannot be used with --agent')
+            exit(-1)
+        self._coprocess = local()
+        self._coprocesses = []
+        self._coprocesses_lock = Semaphore(1)
+        # create workers pool (the queue is bounded, commands are generated while running)
+        if remote:
+            # the agents decide how many tasks they run at the same time
+            try:
+                token = read_token(self.args.agent_token_file)
+                if not token:
+                    raise ValueError('A token is required (see --agent-token-file)')
+                self.pool = RemotePool(self.args.agent,
+                                       self._exception_handler,
+                                       token,
+                                       shell=not self.args.no_shell,
+                                       grace=self.args.timeout_grace)
+            except (OSError, ValueError) as e:
+                brlogger.error('Cannot connect to the agents. {}'.format(e))
+                exit(-1)
+            self.is_parallel = self.pool.slot_count > 1
+            self._task = self._remote_task
+        elif self.args.backend == 'asyncio':
+            # one event loop runs all the tasks, each worker is a slot (asyncio is slow to import)
+            from .utils.aiopool import AsyncPool
+            self.pool = AsyncPool(num_workers, self._exception_handler)
+            self._task = self._async_worker_task
+        else:
+            queue_size = num_workers * DISPATCH_QUEUE_SLOTS_PER_WORKER
+            self.pool = Pool(num_workers, self._exception_handler, queue_size)
+            self._task = self._worker_task
+        # adapt the number of workers to the load of the machine
+        self.controller = None
+        if self.args.load_max is not None or self.args.mem_free_min is not None:
+            if not ConcurrencyController.is_supported():
+                brlogger.error('Adaptive concurrency requires /proc/loadavg and /proc/meminfo')
+                exit(-1)
+            initial = min(num_workers, NUMBER_OF_CORES)
+            self.controller = ConcurrencyController(self.pool, initial, num_workers,
+                                                    self.args.load_max, self.args.mem_free_min)
+        # run a copy of the stragglers once all the tasks were dispatched
+        self.speculator = None
+        if self.args.speculate and not self.args.dry_run:
+            self.speculator = Speculator(self.pool, self.args.speculate, SPECULATE_INTERVAL_SECS)
+        # kill the tasks that run longer than their timeout
+        self.watchdog = Watchdog(self.args.timeout_grace) if self.args.timeout else None
+        # export the stats for monitoring
+        self.metrics = None
+        if self.args.metrics_addr:
+            # http.server is only imported when the metrics are served
+            from .utils.metrics import MetricsServer
+            collect = lambda: (self._get_progress(), self.pool.stats.get_histogram())
+            try:
+                self.metrics = MetricsServer(self.args.metrics_addr, collect)
+            except (OSError, ValueError) as e:
+                brlogger.error('The metrics cannot be served. {}'.format(e))
+                exit(-1)
 
     def start(self):
         self.status(AppStatus.RUNNING)
-        # add commands to the pool
-        for cc in self.config:
-            cmd = cc.apply(self.args.command)
-            self.pool.enqueue(self._worker_task, cmd)
+        self.pool.stats.set('tasks_total', 0 if self.batched else (self.size or 0))
         # start pool
         self.pool.run()
-        # monitor the status of the app
-        while (self.pool.alive() and not self.pool.idle()) or (not self.pool.done()):
+        if self.controller:
+            self.controller.start()
+        if self.metrics:
+            self.metrics.start()
+        if self.watchdog:
+            self.watchdog.start()
+        if self.speculator:
+            self.speculator.start()
+        # feed commands to the pool as the workers consume them
+        self.pool.dispatch(self._generate_tasks())
+        # monitor the status of the app until the pool shuts down
+        while not self.pool.wait(1.0 / APP_HEARTBEAT_HZ):
             self._update_status()
             brconsole.set_progress(self._get_progress())
             # Status: ABORTING
@@ -96,13 +245,37 @@ class Brun():
             if self.status() == AppStatus.KILLING:
                 brlogger.warning('Escalating to KILL...')
                 sys.exit(1)
-            # breath
-            time.sleep(1.0 / APP_HEARTBEAT_HZ)
+        if self.pool.aborted.is_set():
+            self._count_aborted()
+        if self.controller:
+            self.controller.stop()
+        if self.metrics:
+            self.metrics.stop()
+        if self.watchdog:
+            self.watchdog.stop()
+        if self.speculator:
+            self.speculator.stop()
         # update status bar one more time and then stop it
         brconsole.set_progress(self._get_progress())
         brconsole.set_show_status(False)
+        for coprocess in self._coprocesses:
+            coprocess.close()
         # show collected errors
         self._process_tasks_output()
+        if self.spool:
+            self.spool.close()
+        if self.journal:
+            self.journal.close()
+        if self.history:
+            self.history.save()
+        if self.report:
+            self.report.close()
+            self._print_report_summary()
+        # the tasks could not be generated (or sent to the agents)
+        if self.pool.error is not None:
+            brlogger.error(str(self.pool.error))
+            brconsole.close()
+            exit(-1)
         # ---
         brlogger.info('Done!')
         brconsole.close()
@@ -126,25 +299,81 @@ class Brun():
         if s and time.time() - s > ESCALATE_TO_KILL_AFTER_SECS:
             self.status(AppStatus.KILLING)
 
+    def _count_aborted(self):
+        stats = self.pool.get_stats()
+        # the combinations that were never generated are not counted by the pool
+        if self.size is not None and not self.batched:
+            done = stats['tasks_completed'] + stats['tasks_failed']
+            self.pool.stats.set('tasks_aborted', max(0, stats['tasks_total'] - done))
+        aborted = self.pool.get_stats()['tasks_aborted']
+        brlogger.info(':brun: Aborted, {} tasks were not started'.format(aborted))
+
+    def _generate_tasks(self):
+        configs = self.config.select(self.shard)
+        if self.resumed:
+            configs = self._skip_succeeded(configs)
+        if self.history:
+            # streamed values are sorted in windows, they are not all read up front
+            window = None if self.size is not None else \
+                HISTORY_WINDOW_PER_SLOT * max(1, self.pool.get_stats()['jobs_max'])
+            configs = self.history.order(configs, self._values, window)
+        if self.batched:
+            # several combinations per command
+            configs = batch(configs,
+                            self.args.command,
+                            self.args.batch or None,
+                            shell=not self.args.no_shell)
+        streamed = self.batched or self.size is None
+        for cc in configs:
+            # the values of streamed fields that arrive after an abort are not waited for
+            if self.size is None and self.pool.aborted.is_set():
+                return
+            cmd = cc.apply(self.args.command)
+            # the total grows as the values of streamed fields arrive (or batches are formed)
+            if streamed:
+                self.pool.stats.increase('tasks_total')
+            yield self._task, (cmd, cc), {'timeout': self._get_timeout(cc)}
+
+    def _skip_succeeded(self, configs):
+        for cc in configs:
+            if self._identity(cc) in self.resumed:
+                # the combination was counted in the total already
+                if not self.batched and self.size is not None:
+                    self.pool.stats.decrease('tasks_total')
+                continue
+            yield cc
+
+    def _identity(self, cc):
+        return Journal.identity(self._values(cc))
+
+    def _values(self, cc):
+        return {f: cc.get(f) for f in self.config.fields()}
+
     def _process_tasks_output(self, stderr_only=False):
-        cmds = []
-        stdouts = []
-        stderrs = []
-        # get cmd, stdout, and stderr
         for res in self.pool.results():
             cmd = ' '.join(res.cmd)
-            cmds.append(cmd)
-            stdouts.append(res.stdout)
-            stderrs.append(res.stderr)
-        # dump stdout to console
-        if not stderr_only:
-            for cmd, std in zip(cmds, stdouts):
-                if res.returncode == 0 and len(std):
-                    brconsole.write(TASK_OUTPUT_TEMPLATE.format(cmd=cmd, content=std))
-        # dump stderr to console
-        for cmd, std in zip(cmds, stderrs):
-            if res.returncode != 0 and len(std):
-                brconsole.write(TASK_ERROR_TEMPLATE.format(cmd=cmd, content=std))
+            # dump stdout to console
+            if not stderr_only and res.returncode == 0 and len(res.stdout):
+                brconsole.write(TASK_OUTPUT_TEMPLATE.format(cmd=cmd, content=res.stdout))
+            # dump stderr to console
+            if res.returncode != 0 and len(res.stderr):
+                brconsole.write(TASK_ERROR_TEMPLATE.format(cmd=cmd, content=res.stderr))
+
+    def _print_report_summary(self):
+        summary = self.report.summary()
+        if not summary:
+            return
+        lines = ['Resources used by the tasks (p50 / p95 / max):']
+        units = {'wall': 's', 'user': 's', 'sys': 's', 'maxrss': 'MB'}
+        scale = {'maxrss': 1.0 / 1024}
+        for figure, values in summary.items():
+            values = [v * scale.get(figure, 1) for v in values]
+            lines.append('  {:<8s}{:.2f} / {:.2f} / {:.2f} {}'.format(
+                figure, *values, units[figure]))
+        if self.report.maxrss_unknown:
+            lines.append('  ({} tasks used less memory than brun, their maxrss '.format(
+                self.report.maxrss_unknown) + 'is not known and not counted)')
+        brlogger.info('\n'.join(lines))
 
     def _get_progress(self):
         stats = self.pool.get_stats()
@@ -154,46 +383,259 @@ class Brun():
             AppStatus.ABORTING: 'aborting',
             AppStatus.KILLING: 'killing'
         }[self.status()]
+        stats['eta'] = self._get_eta(stats)
         return stats
 
-    def _worker_task(self, cmd):
+    def _get_eta(self, stats):
+        # the total is not known in advance for streamed fields and batches
+        if self.size is None or self.batched:
+            return None
+        done = stats['tasks_completed'] + stats['tasks_failed'] + stats['tasks_aborted']
+        remaining = max(0, stats['tasks_total'] - done)
+        busy = stats['jobs_max'] - stats['jobs_idle']
+        if remaining == 0:
+            return 0
+        if stats['task_duration_mean'] == 0 or busy == 0:
+            return None
+        # the remaining tasks are shared by the slots that are busy right now
+        return remaining * stats['task_duration_mean'] / busy
+
+    def _worker_task(self, cmd, cc, timeout=None, speculative=False):
         cmd_str = ' '.join(cmd)
-        stdout_pipe = subprocess.PIPE
-        result = types.SimpleNamespace(cmd=cmd, stdout="", stderr="", returncode=None)
+        result = _new_result(cmd)
         # -->
         brlogger.info(PARALLEL_TO_START_PROMPT_STRING[self.is_parallel].format(cmd_str))
-        if not self.args.dry_run:
-            no_sigint = lambda: signal.signal(signal.SIGINT, signal.SIG_IGN)
-            # launch task
-            task = subprocess.Popen(cmd_str,
-                                    shell=True,
-                                    stdout=stdout_pipe,
-                                    stderr=subprocess.PIPE,
-                                    preexec_fn=no_sigint)
+        attempt = None
+        key = self._cache_key(cmd, cc)
+        if key is not None and self._replay_cached(key, cc, cmd_str, result):
+            pass
+        elif not self.args.dry_run and self.args.coprocess:
+            # run the task in the shell owned by this worker
+            output = self._task_output(cc, cmd_str, record=key is not None)
+            coprocess = self._get_coprocess()
+            started = time.time()
+            # the shell is killed on timeout, it is restarted for the next task
+            deadline = self._watch(coprocess.pid, timeout)
+            returncode = coprocess.run(cmd_str, output.on_stdout, output.on_stderr)
+            self._unwatch(deadline, result)
+            result.duration = time.time() - started
+            output.close(result)
+            result.returncode = returncode
+            self._store_cached(key, output, result)
+            self._task_completed(result, cc)
+        elif not self.args.dry_run:
+            # launch task (the tokens are used as argv directly when the shell is not needed)
+            started = time.time()
+            try:
+                task = subprocess.Popen(cmd if self.args.no_shell else cmd_str,
+                                        shell=not self.args.no_shell,
+                                        stdin=subprocess.DEVNULL,
+                                        stdout=subprocess.PIPE,
+                                        stderr=subprocess.PIPE,
+                                        **_SPAWN_KWARGS)
+            except OSError as e:
+                self._task_not_executed(result, e)
+            if self.speculator:
+                task_args = (self._worker_task, (cmd, cc), {'timeout': timeout})
+                attempt = self.speculator.register(cc.id, task.pid, task_args, speculative)
+                if attempt is None:
+                    # the task completed while this copy was waiting for a slot
+                    killpg(task.pid, signal.SIGKILL)
+                    try:
+                        _wait(task)
+                    finally:
+                        # the pipes are not drained, they are closed here
+                        task.stdout.close()
+                        task.stderr.close()
+                    raise TaskCancelledError('Task completed already: {}'.format(cmd_str))
+            deadline = self._watch(task.pid, timeout)
+            # read stdout and stderr while the task runs (a full pipe would block it)
+            output = self._task_output(cc, cmd_str, record=key is not None)
+            _drain_pipes(task, output.on_stdout, output.on_stderr)
+            # wait for the task to end (and get the resources it used)
+            usage = _wait(task)
+            self._unwatch(deadline, result)
+            result.duration = time.time() - started
+            if usage is not None:
+                result.usage = dict(wall=result.duration, **usage)
+            output.close(result)
+            # get return code
+            result.returncode = task.returncode
+            if attempt is not None and not self.speculator.finish(attempt):
+                # another copy of the task completed first and killed this one
+                raise TaskCancelledError('Task completed by another copy: {}'.format(cmd_str))
+            self._store_cached(key, output, result)
+            self._task_completed(result, cc)
+        # <--
+        brlogger.info(PARALLEL_TO_END_PROMPT_STRING[self.is_parallel].format(cmd_str))
+        return result
+
+    async def _async_worker_task(self, cmd, cc, timeout=None):
+        import asyncio
+        cmd_str = ' '.join(cmd)
+        result = _new_result(cmd)
+        # -->
+        brlogger.info(PARALLEL_TO_START_PROMPT_STRING[self.is_parallel].format(cmd_str))
+        key = self._cache_key(cmd, cc)
+        if key is not None and self._replay_cached(key, cc, cmd_str, result):
+            pass
+        elif not self.args.dry_run:
+            # launch task (the tokens are used as argv directly when the shell is not needed)
+            pipes = dict(stdin=asyncio.subprocess.DEVNULL,
+                         stdout=asyncio.subprocess.PIPE,
+                         stderr=asyncio.subprocess.PIPE)
+            started = time.time()
+            try:
+                if self.args.no_shell:
+                    task = await asyncio.create_subprocess_exec(*cmd, **pipes, **_SPAWN_KWARGS)
+                else:
+                    task = await asyncio.create_subprocess_shell(cmd_str, **pipes, **_SPAWN_KWARGS)
+            except OSError as e:
+                self._task_not_executed(result, e)
+            deadline = self._watch(task.pid, timeout)
+            # read stdout and stderr while the task runs
+            output = self._task_output(cc, cmd_str, record=key is not None)
+            await asyncio.gather(_async_read_lines(task.stdout, output.on_stdout),
+                                 _async_read_lines(task.stderr, output.on_stderr))
             # wait for the task to end
-            task.wait()
-            # fetch and decode stdout and stderr
-            stdout = task.stdout.read().decode('utf-8').rstrip()
-            stderr = task.stderr.read().decode('utf-8').rstrip()
-            # print right now if not parallel, store for later otherwise
-            result.stdout = stdout
-            result.stderr = stderr
-            if not self.is_parallel and self.args.verbose:
-                brlogger.info(stdout, clear=True)
-                if task.returncode == 0:
-                    brlogger.info(stderr, clear=True)
+            await task.wait()
+            self._unwatch(deadline, result)
+            result.duration = time.time() - started
+            output.close(result)
             # get return code
             result.returncode = task.returncode
-            # on failure
-            if task.returncode != 0:
-                brlogger.info(PARALLEL_TO_FAILURE_PROMPT_STRING[self.is_parallel].format(cmd_str))
-                # raise error
-                msg = 'The command {} failed with exit code {}.'
-                raise TaskFailureError(msg.format(cmd, task.returncode), result)
+            self._store_cached(key, output, result)
+            self._task_completed(result, cc)
         # <--
         brlogger.info(PARALLEL_TO_END_PROMPT_STRING[self.is_parallel].format(cmd_str))
         return result
 
+    def _remote_task(self, cmd, cc, reply, timeout=None):
+        cmd_str = ' '.join(cmd)
+        result = _new_result(cmd)
+        # the task ran on an agent, its output goes where the output of local tasks goes
+        output = self._task_output(cc, cmd_str)
+        for line in reply['stdout'].splitlines():
+            output.on_stdout(line)
+        for line in reply['stderr'].splitlines():
+            output.on_stderr(line)
+        output.close(result)
+        result.returncode = reply['returncode']
+        result.duration = reply['duration']
+        result.timed_out = reply['timed_out']
+        self._task_completed(result, cc)
+        brlogger.info(PARALLEL_TO_END_PROMPT_STRING[self.is_parallel].format(cmd_str))
+        return result
+
+    def _get_timeout(self, cc):
+        if self.args.timeout is None:
+            return None
+        # the timeout can depend on the values of the fields (e.g., {t})
+        value = cc.apply([self.args.timeout])[0]
+        try:
+            timeout = float(value)
+        except ValueError:
+            msg = "Invalid timeout '{}', expected a number of seconds".format(value)
+            raise CLISyntaxError(msg)
+        # no timeout when it is 0
+        return timeout if timeout > 0 else None
+
+    def _watch(self, pgid, timeout):
+        if timeout is None:
+            return None
+        return self.watchdog.watch(pgid, timeout)
+
+    def _unwatch(self, deadline, result):
+        if deadline is None:
+            return
+        self.watchdog.cancel(deadline)
+        result.timed_out = deadline.timed_out
+
+    def _get_coprocess(self):
+        if not hasattr(self._coprocess, 'shell'):
+            self._coprocess.shell = ShellCoprocess(**_SPAWN_KWARGS)
+            with self._coprocesses_lock:
+                self._coprocesses.append(self._coprocess.shell)
+        return self._coprocess.shell
+
+    def _task_output(self, cc, cmd_str, record=False):
+        prefix = cc.apply([self.args.stream_prefix])[0] if self.args.stream else None
+        spooled = self.spool.open(cc.id, cmd_str) if self.spool else None
+        return _TaskOutput(prefix, spooled, record)
+
+    def _cache_key(self, cmd, cc):
+        if self.cache is None or self.args.dry_run:
+            return None
+        # the values of the input fields are paths to files the command depends on
+        inputs = cc.apply(['{%s...}' % name for name in self.args.input_field])
+        # the same tokens mean different things with and without the shell
+        cmd_str = '\0'.join(cmd) if self.args.no_shell else ' '.join(cmd)
+        return self.cache.key(cmd_str, inputs)
+
+    def _replay_cached(self, key, cc, cmd_str, result):
+        cached = self.cache.get(key)
+        if cached is None:
+            return False
+        output = self._task_output(cc, cmd_str)
+        for line in cached['stdout']:
+            output.on_stdout(line)
+        for line in cached['stderr']:
+            output.on_stderr(line)
+        output.close(result)
+        result.returncode = cached['returncode']
+        self.pool.stats.increase('tasks_cached')
+        self._task_completed(result, cc)
+        return True
+
+    def _store_cached(self, key, output, result):
+        # failures are not cached, they are often caused by something other than the inputs
+        if key is None or result.returncode != 0:
+            return
+        stdout, stderr = output.recorded
+        self.cache.put(key, result.returncode, stdout, stderr)
+
+    def _task_not_executed(self, result, error):
+        # the executable could not be found or run
+        cmd_str = ' '.join(result.cmd)
+        result.stderr = str(error)
+        result.returncode = 127
+        brlogger.info(PARALLEL_TO_FAILURE_PROMPT_STRING[self.is_parallel].format(cmd_str))
+        msg = 'The command {} could not be executed. {}'
+        raise TaskFailureError(msg.format(result.cmd, str(error)), result)
+
+    def _task_completed(self, result, cc):
+        if self.journal:
+            # a batch completes all its combinations at once
+            for member in getattr(cc, 'members', [cc]):
+                self.journal.record(self._identity(member), result.returncode)
+        if self.report:
+            self.report.write(self._values(cc), ' '.join(result.cmd), result.returncode,
+                              result.usage)
+        # the duration of a batch says little about the duration of its combinations
+        if self.history and not self.batched and result.returncode == 0 \
+                and result.duration is not None:
+            self.history.record(self._values(cc), result.duration)
+        # print right now if not parallel, store for later otherwise
+        if not self.is_parallel and self.args.verbose:
+            brlogger.info(result.stdout, clear=True)
+            if result.returncode == 0:
+                brlogger.info(result.stderr, clear=True)
+        # killed after its timeout
+        if result.timed_out:
+            cmd_str = ' '.join(result.cmd)
+            self.pool.stats.increase('tasks_timedout')
+            brlogger.info(PARALLEL_TO_TIMEOUT_PROMPT_STRING[self.is_parallel].format(cmd_str))
+            msg = 'The command {} timed out after {:.1f} s.'.format(result.cmd, result.duration)
+            result.stderr = '\n'.join([result.stderr, msg]).strip()
+            raise TaskFailureError(msg, result)
+        # on failure
+        if result.returncode != 0:
+            cmd_str = ' '.join(result.cmd)
+            brlogger.info(PARALLEL_TO_FAILURE_PROMPT_STRING[self.is_parallel].format(cmd_str))
+            # raise error
+            msg = 'The command {} failed with exit code {}.'
+            raise TaskFailureError(msg.format(result.cmd, result.returncode), result)
+
     def _exception_handler(self, name, exception_type, exception, tback, *args, **kwargs):
         # abort remaining tasks
         if not self.args.ignore_errors:
@@ -218,3 +660,112 @@ class Brun():
 
         # register signal handler
         signal.signal(signal.SIGINT, signal_handler)
+
+
+class _TaskOutput(object):
+    """Sends the lines of output of a task to the console, to the spool or to memory"""
+    def __init__(self, stream_prefix=None, spooled=None, record=False):
+        self._stdout, self._stderr = [], []
+        self._spooled = spooled
+        self.recorded = None
+        on_stdout, on_stderr = [], []
+        if stream_prefix is not None:
+            on_line = lambda line: brlogger.info(stream_prefix + line, clear=True)
+            on_stdout.append(on_line)
+            on_stderr.append(on_line)
+        if spooled:
+            on_stdout.append(spooled[0].write)
+            on_stderr.append(spooled[1].write)
+        if not on_stdout:
+            on_stdout.append(self._stdout.append)
+            on_stderr.append(self._stderr.append)
+            # all the lines are in memory already
+            self.recorded = (self._stdout, self._stderr)
+        elif record:
+            # all the lines are recorded when they need to be cached
+            self.recorded = ([], [])
+            on_stdout.append(self.recorded[0].append)
+            on_stderr.append(self.recorded[1].append)
+        self.on_stdout = _chain(*on_stdout)
+        self.on_stderr = _chain(*on_stderr)
+
+    def close(self, result):
+        result.stdout = '\n'.join(self._stdout).rstrip()
+        result.stderr = '\n'.join(self._stderr).rstrip()
+        if self._spooled:
+            # only the tail of stderr is kept, the output is on disk
+            for spooled_output in self._spooled:
+                spooled_output.close()
+            result.stderr = self._spooled[1].tail().rstrip()
+
+
+def _new_result(cmd):
+    """Result of a task, filled in while it runs"""
+    return types.SimpleNamespace(cmd=cmd,
+                                 stdout="",
+                                 stderr="",
+                                 returncode=None,
+                                 duration=None,
+                                 usage=None,
+                                 timed_out=False)
+
+
+def _wait(task):
+    """Reaps a task, returns the resources used by it (and by the children it waited for)"""
+    try:
+        _, status, rusage = os.wait4(task.pid, 0)
+    except ChildProcessError:
+        # reaped already
+        task.wait()
+        return None
+    # tell Popen that the process is gone
+    task.returncode = -os.WTERMSIG(status) if os.WIFSIGNALED(status) else \
+        os.WEXITSTATUS(status)
+    # the child inherits the peak RSS of brun (its memory until exec), so the peak of a task
+    # that used less than that is not known
+    floor = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return {
+        'user': rusage.ru_utime,
+        'sys': rusage.ru_stime,
+        # kilobytes
+        'maxrss': rusage.ru_maxrss if rusage.ru_maxrss > floor else None,
+        'inblock': rusage.ru_inblock,
+        'oublock': rusage.ru_oublock,
+        'nvcsw': rusage.ru_nvcsw,
+        'nivcsw': rusage.ru_nivcsw
+    }
+
+
+def _drain_pipes(task, on_stdout, on_stderr):
+    """Reads stdout and stderr of a task concurrently, line by line, until both are closed"""
+    reader = Thread(target=_read_lines, args=(task.stderr, on_stderr), daemon=True)
+    reader.start()
+    _read_lines(task.stdout, on_stdout)
+    reader.join()
+
+
+def _chain(*callbacks):
+    def _callback(line):
+        for callback in callbacks:
+            callback(line)
+
+    return _callback
+
+
+def _read_lines(pipe, on_line):
+    for line in iter(pipe.readline, b''):
+        on_line(line.decode('utf-8', errors='replace').rstrip('\n'))
+    pipe.close()
+
+
+async def _async_read_lines(reader, on_line):
+    buffer = b''
+    while True:
+        chunk = await reader.read(READ_CHUNK_SIZE)
+        if not chunk:
+            break
+        *lines, buffer = (buffer + chunk).split(b'\n')
+        for line in lines:
+            on_line(line.decode('utf-8', errors='replace'))
+    if buffer:
+        on_line(buffer.decode('utf-8', errors='replace'))
@@ -1 +1,12 @@
 from .pool import Pool, Worker
+from .spool import OutputSpool
+from .adaptive import ConcurrencyController
+from .coprocess import ShellCoprocess
+from .cache import ResultCache
+from .journal import Journal
+from .remote import RemotePool
+from .history import RuntimeHistory
+from .report import TaskReport
+from .watchdog import Watchdog
+from .speculate import Speculator
+from .process import killpg
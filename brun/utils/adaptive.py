@@ -0,0 +1,73 @@
+import os
+
+from threading import Thread, Event
+
+from brun import brlogger
+
+PROC_LOADAVG = '/proc/loadavg'
+PROC_MEMINFO = '/proc/meminfo'
+
+
+class ConcurrencyController(Thread):
+    """
+    Resizes a pool at runtime so that the load average stays below `load_max` and
+    the available memory (in MB) stays above `mem_free_min`.
+    The number of workers grows by one at a time and shrinks by one (load) or by half (memory).
+    """
+    def __init__(self, pool, initial, maximum, load_max=None, mem_free_min=None, interval=1.0):
+        Thread.__init__(self)
+        self.pool = pool
+        self.count = max(1, min(initial, maximum))
+        self.maximum = maximum
+        self.load_max = load_max
+        self.mem_free_min = mem_free_min
+        self.interval = interval
+        self.stopped = Event()
+        self.daemon = True
+        self.pool.resize(self.count)
+
+    @staticmethod
+    def is_supported():
+        return os.path.exists(PROC_LOADAVG) and os.path.exists(PROC_MEMINFO)
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            count = self._next_count(self.pool.get_stats())
+            if count != self.count:
+                brlogger.debug('Adaptive concurrency: {} -> {} workers'.format(self.count, count))
+                self.count = count
+                self.pool.resize(count)
+
+    def stop(self):
+        self.stopped.set()
+
+    def _next_count(self, stats):
+        # memory pressure is dangerous (swap, OOM), back off quickly
+        if self.mem_free_min is not None and get_mem_available() < self.mem_free_min:
+            return max(1, self.count // 2)
+        if self.load_max is not None:
+            load = get_load()
+            if load > self.load_max:
+                return max(1, self.count - 1)
+            # leave some room before growing
+            if load > self.load_max - 1:
+                return self.count
+        # only grow when all the current workers are busy
+        if stats['jobs_idle'] > 0:
+            return self.count
+        return min(self.maximum, self.count + 1)
+
+
+def get_load():
+    """1-minute load average"""
+    with open(PROC_LOADAVG, 'rt') as fin:
+        return float(fin.read().split()[0])
+
+
+def get_mem_available():
+    """Memory available for new processes (in MB)"""
+    with open(PROC_MEMINFO, 'rt') as fin:
+        for line in fin:
+            if line.startswith('MemAvailable:'):
+                return int(line.split()[1]) / 1024.0
+    return float('inf')
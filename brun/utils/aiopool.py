@@ -0,0 +1,196 @@
+import os
+import sys
+import time
+import asyncio
+import resource
+import traceback
+
+from queue import Queue, Empty
+from threading import Thread, Event
+
+from brun import brlogger
+from brun.exceptions import TaskFailureError
+from .pool import StatisticsCollector, Limiter
+
+# file descriptors used by each slot (stdout, stderr, pidfd and one spare)
+FDS_PER_SLOT = 4
+
+
+class AsyncPool:
+    """Pool of slots running coroutines on a single event loop (run by a background thread)"""
+    def __init__(self, slot_count, exception_handler):
+        self.slot_count = slot_count
+        self.exception_handler = exception_handler
+        self.resultQueue = Queue()
+        self.stats = StatisticsCollector()
+        self.slots = Limiter(slot_count)
+        self.running = 0
+        self.loop = None
+        self.thread = None
+        self.dispatcher = None
+        self.aborted = Event()
+        # error that stopped the dispatch of the tasks (e.g., invalid command)
+        self.error = None
+        self.finished = Event()
+        # global state changed while the pool runs, restored on shutdown
+        self._watcher = None
+        self._fds_limit = None
+
+    """Start the event loop, return False if it is already running"""
+
+    def run(self):
+        if self.alive():
+            return False
+        self.aborted.clear()
+        self.error = None
+        self.finished.clear()
+        self._fds_limit = _raise_fds_limit(self.slot_count * FDS_PER_SLOT)
+        self.loop, self._watcher = _new_event_loop()
+        self.thread = Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+        return True
+
+    """Run the coroutines generated by an iterable of (func, args, kwargs)"""
+
+    def dispatch(self, tasks):
+        self.dispatcher = Thread(target=self._dispatch, args=(tasks, ), daemon=True)
+        self.dispatcher.start()
+
+    def _dispatch(self, tasks):
+        try:
+            for func, args, kwargs in tasks:
+                #block until a slot is free
+                self.slots.acquire()
+                if self.aborted.is_set():
+                    self.slots.release()
+                    #the rest of the generator is not consumed
+                    self.stats.increase('tasks_aborted')
+                    break
+                asyncio.run_coroutine_threadsafe(self._run(func, args, kwargs), self.loop)
+        except Exception as e:
+            self.error = e
+            self.abort()
+        finally:
+            self.shutdown()
+
+    async def _run(self, func, args, kwargs):
+        self.running += 1
+        started = time.time()
+        try:
+            #the coroutine may raise
+            result = await func(*args, **kwargs)
+            self.stats.increase('tasks_completed')
+            if (result is not None):
+                self.resultQueue.put(result)
+        except TaskFailureError:
+            ex_type, ex, tb = sys.exc_info()
+            # get partial results and errors
+            result = ex.result
+            if (result is not None):
+                self.resultQueue.put(result)
+            self.stats.increase('tasks_failed')
+            self.exception_handler('asyncio', ex_type, ex, tb, args, kwargs)
+        except:
+            ex_type, ex, tb = sys.exc_info()
+            self.stats.increase('tasks_failed')
+            traceback.print_exception(ex_type, ex, tb, file=sys.stderr)
+        finally:
+            self.stats.task_done(time.time() - started)
+            self.running -= 1
+            self.slots.release()
+
+    """Wait for all the slots to be released, then stop the event loop"""
+
+    def shutdown(self):
+        self.slots.join()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+        if self._watcher is not None:
+            _restore_child_watcher(*self._watcher)
+            self._watcher = None
+        if self._fds_limit is not None:
+            resource.setrlimit(resource.RLIMIT_NOFILE, self._fds_limit)
+            self._fds_limit = None
+        self.finished.set()
+
+    """Change the number of tasks allowed to run at the same time"""
+
+    def resize(self, count):
+        self.slots.resize(max(1, min(count, self.slot_count)))
+
+    """Wait for the pool to shutdown, returns False if the timeout expires first"""
+
+    def wait(self, timeout=None):
+        return self.finished.wait(timeout)
+
+    """Stop starting new tasks, running tasks are not interrupted"""
+
+    def abort(self):
+        self.aborted.set()
+
+    """Returns True if the event loop is running"""
+
+    def alive(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    """Returns True if no tasks are running"""
+
+    def idle(self):
+        return self.running == 0
+
+    """Returns True if the pool shut down after completing all the tasks"""
+
+    def done(self):
+        return self.finished.is_set()
+
+    """Get the set of results that have been processed, repeatedly call until done"""
+
+    def results(self):
+        results = []
+        try:
+            while True:
+                results.append(self.resultQueue.get(False))
+                self.resultQueue.task_done()
+        except Empty:
+            pass
+        return results
+
+    def get_stats(self):
+        stats = self.stats.get_stats()
+        stats['jobs_max'] = self.slots.limit if self.alive() else 0
+        stats['jobs_idle'] = max(0, stats['jobs_max'] - self.running)
+        stats['tasks_queued'] = 0
+        return stats
+
+
+def _new_event_loop():
+    """Returns a new loop and (watcher, previous watcher) if the child watcher was replaced"""
+    loop = asyncio.new_event_loop()
+    # before Python 3.12, children are waited by one thread each unless pidfds are used
+    if sys.version_info < (3, 12) and hasattr(asyncio, 'PidfdChildWatcher') \
+            and hasattr(os, 'pidfd_open'):
+        policy = asyncio.get_event_loop_policy()
+        previous = policy.get_child_watcher()
+        watcher = asyncio.PidfdChildWatcher()
+        watcher.attach_loop(loop)
+        policy.set_child_watcher(watcher)
+        return loop, (watcher, previous)
+    return loop, None
+
+
+def _restore_child_watcher(watcher, previous):
+    watcher.close()
+    asyncio.get_event_loop_policy().set_child_watcher(previous)
+
+
+def _raise_fds_limit(fds):
+    """Raises the soft limit of open files, returns the previous limits if it was changed"""
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft == resource.RLIM_INFINITY or soft >= fds:
+        return None
+    limit = fds if hard == resource.RLIM_INFINITY else min(fds, hard)
+    if limit <= soft:
+        return None
+    resource.setrlimit(resource.RLIMIT_NOFILE, (limit, hard))
+    return soft, hard
@@ -0,0 +1,106 @@
+import os
+import json
+import time
+import hashlib
+import tempfile
+
+from threading import Semaphore
+
+from brun.constants import READ_CHUNK_SIZE
+
+
+class ResultCache(object):
+    """
+    On-disk store of the results of the commands, addressed by the hash of everything a
+    command depends on (the rendered command and the content of its input files). The least
+    recently used entries are evicted when the store grows beyond its maximum size (in bytes).
+    """
+    def __init__(self, directory, max_size):
+        self.directory = directory
+        self.max_size = max_size
+        os.makedirs(self.directory, exist_ok=True)
+        self._lock = Semaphore(1)
+        # digests of the input files, valid as long as their mtime and size do not change
+        self._digests = dict()
+        # last use and size of each entry
+        self._entries = dict()
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.json') and entry.is_file():
+                stat = entry.stat()
+                self._entries[entry.name] = (stat.st_mtime, stat.st_size)
+        self.size = sum([s for _, s in self._entries.values()])
+
+    def key(self, cmd_str, inputs=()):
+        """Returns the key of a command, None if one of its input files cannot be read"""
+        h = hashlib.sha256(cmd_str.encode('utf-8'))
+        for path in inputs:
+            digest = self._digest(path)
+            if digest is None:
+                return None
+            h.update(b'\0' + path.encode('utf-8') + b'\0' + digest)
+        return h.hexdigest()
+
+    def get(self, key):
+        """Returns the result stored under the given key, None if there is none"""
+        name = key + '.json'
+        path = os.path.join(self.directory, name)
+        try:
+            with open(path, 'rt') as fin:
+                result = json.load(fin)
+            # mark the entry as recently used
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+        self._lock.acquire()
+        if name in self._entries:
+            self._entries[name] = (time.time(), self._entries[name][1])
+        self._lock.release()
+        return result
+
+    def put(self, key, returncode, stdout, stderr):
+        name = key + '.json'
+        data = json.dumps({'returncode': returncode, 'stdout': stdout, 'stderr': stderr})
+        # entries are written to a temporary file first, readers never see partial entries
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'wt') as fout:
+            fout.write(data)
+        os.replace(tmp, os.path.join(self.directory, name))
+        self._lock.acquire()
+        _, size = self._entries.pop(name, (None, 0))
+        self._entries[name] = (time.time(), len(data))
+        self.size += len(data) - size
+        if self.size > self.max_size:
+            self._evict()
+        self._lock.release()
+
+    def _evict(self):
+        # drop the least recently used entries until the store is back to 90% of its size
+        target = self.max_size * 0.9
+        for name, (_, size) in sorted(self._entries.items(), key=lambda e: e[1][0]):
+            if self.size <= target:
+                break
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                pass
+            del self._entries[name]
+            self.size -= size
+
+    def _digest(self, path):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        mtime, size, digest = self._digests.get(path, (None, None, None))
+        if (mtime, size) == (stat.st_mtime_ns, stat.st_size):
+            return digest
+        h = hashlib.sha256()
+        try:
+            with open(path, 'rb') as fin:
+                for chunk in iter(lambda: fin.read(READ_CHUNK_SIZE), b''):
+                    h.update(chunk)
+        except OSError:
+            return None
+        digest = h.digest()
+        self._digests[path] = (stat.st_mtime_ns, stat.st_size, digest)
+        return digest
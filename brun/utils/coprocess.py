@@ -0,0 +1,131 @@
+import os
+import uuid
+import shlex
+import selectors
+import subprocess
+
+from brun.constants import READ_CHUNK_SIZE
+
+
+class ShellCoprocess(object):
+    """
+    Long-lived shell that runs one command at a time.
+
+    Each command is written to the stdin of the shell followed by a marker printed on both
+    stdout and stderr (together with the exit status on stdout), so that running a command
+    costs a pipe write instead of a fork+exec. Commands share the state of the shell (e.g.,
+    variables), the working directory is restored after each command. A command that
+    terminates the shell (e.g., `exit`) is reported with the exit status of the shell,
+    which is then restarted.
+    """
+    def __init__(self, shell='/bin/sh', **popen_kwargs):
+        self._shell = shell
+        self._popen_kwargs = popen_kwargs
+        self._marker = '__brun_{}'.format(uuid.uuid4().hex)
+        self._count = 0
+        self._cwd = os.getcwd()
+        self._process = None
+
+    @property
+    def pid(self):
+        """PID of the shell (and ID of its process group), the shell is started if needed"""
+        if self._process is None or self._process.poll() is not None:
+            self._start()
+        return self._process.pid
+
+    def run(self, cmd_str, on_stdout, on_stderr):
+        if self._process is None or self._process.poll() is not None:
+            self._start()
+        self._count += 1
+        marker = '{}_{}'.format(self._marker, self._count)
+        script = 'command eval {cmd} </dev/null\n' + \
+                 'printf "\\n%s %d\\n" {marker} "$?"\n' + \
+                 'printf "\\n%s\\n" {marker} >&2\n' + \
+                 'cd {cwd}\n'
+        script = script.format(cmd=shlex.quote(cmd_str), marker=marker, cwd=shlex.quote(self._cwd))
+        try:
+            self._process.stdin.write(script.encode('utf-8'))
+            self._process.stdin.flush()
+        except BrokenPipeError:
+            pass
+        returncode = self._read(marker, on_stdout, on_stderr)
+        if returncode is None:
+            # the command terminated the shell
+            returncode = self._process.wait()
+            self.close()
+        return returncode
+
+    def close(self):
+        if self._process is None:
+            return
+        for pipe in [self._process.stdin, self._process.stdout, self._process.stderr]:
+            pipe.close()
+        self._process.wait()
+        self._process = None
+
+    def _start(self):
+        self._process = subprocess.Popen([self._shell],
+                                         stdin=subprocess.PIPE,
+                                         stdout=subprocess.PIPE,
+                                         stderr=subprocess.PIPE,
+                                         **self._popen_kwargs)
+
+    def _read(self, marker, on_stdout, on_stderr):
+        """Reads stdout and stderr until the markers, returns the exit status of the command"""
+        returncode = None
+        streams = {
+            self._process.stdout: _FramedStream(marker, on_stdout),
+            self._process.stderr: _FramedStream(marker, on_stderr),
+        }
+        with selectors.DefaultSelector() as selector:
+            for pipe in streams:
+                selector.register(pipe, selectors.EVENT_READ)
+            while selector.get_map():
+                for key, _ in selector.select():
+                    chunk = os.read(key.fileobj.fileno(), READ_CHUNK_SIZE)
+                    stream = streams[key.fileobj]
+                    if not chunk:
+                        # EOF, the shell is gone
+                        stream.close()
+                        selector.unregister(key.fileobj)
+                        continue
+                    if stream.feed(chunk):
+                        selector.unregister(key.fileobj)
+        # the exit status follows the marker on stdout
+        trailer = streams[self._process.stdout].trailer
+        if trailer is not None:
+            returncode = int(trailer)
+        return returncode
+
+
+class _FramedStream(object):
+    """Splits a stream into lines until a marker line is found"""
+    def __init__(self, marker, on_line):
+        self._marker = marker
+        self._on_line = on_line
+        self._buffer = b''
+        # the line before the marker is held back, it may be the newline added by the frame
+        self._pending = None
+        self.trailer = None
+
+    def feed(self, chunk):
+        *lines, self._buffer = (self._buffer + chunk).split(b'\n')
+        for line in lines:
+            line = line.decode('utf-8', errors='replace')
+            if line == self._marker or line.startswith(self._marker + ' '):
+                # the frame adds a newline, an empty line before the marker is not output
+                if self._pending:
+                    self._on_line(self._pending)
+                self._pending = None
+                self.trailer = line[len(self._marker):].strip() or None
+                return True
+            if self._pending is not None:
+                self._on_line(self._pending)
+            self._pending = line
+        return False
+
+    def close(self):
+        if self._pending is not None:
+            self._on_line(self._pending)
+        if self._buffer:
+            self._on_line(self._buffer.decode('utf-8', errors='replace'))
@@ -0,0 +1,73 @@
+import os
+import json
+import hashlib
+import tempfile
+import statistics
+
+from itertools import islice
+from threading import Semaphore
+
+
+class RuntimeHistory(object):
+    """
+    Durations of the combinations of a command template measured in previous runs, stored
+    as an exponential moving average (EMA) for each combination of field values.
+    """
+    def __init__(self, path, template, alpha=0.3):
+        self.path = path
+        self.alpha = alpha
+        self._lock = Semaphore(1)
+        self._template = _digest(template)
+        self._data = dict()
+        if os.path.exists(self.path):
+            with open(self.path, 'rt') as fin:
+                self._data = json.load(fin)
+        self._durations = self._data.setdefault(self._template, dict())
+        # combinations never seen before are expected to be as long as the typical one
+        self.fallback = statistics.median(self._durations.values()) \
+            if self._durations else None
+
+    def predict(self, values):
+        """Returns the expected duration (in seconds) of a combination, None if unknown"""
+        return self._durations.get(_digest(values), self.fallback)
+
+    def record(self, values, duration):
+        key = _digest(values)
+        self._lock.acquire()
+        last = self._durations.get(key)
+        self._durations[key] = duration if last is None else \
+            self.alpha * duration + (1 - self.alpha) * last
+        self._lock.release()
+
+    def order(self, items, values, window=None):
+        """
+        Yields the items longest expected first (LPT). All the items are sorted at once,
+        unless `window` is given: they are then sorted in windows of `window` items, so that
+        streams are not consumed all at once.
+        """
+        items = iter(items)
+        while True:
+            chunk = list(islice(items, window))
+            if not chunk:
+                return
+            predictions = [self.predict(values(item)) for item in chunk]
+            # items with the same prediction keep their order
+            order = sorted(range(len(chunk)), key=lambda i: (-(predictions[i] or 0), i))
+            for i in order:
+                yield chunk[i]
+
+    def save(self):
+        self._lock.acquire()
+        blob = json.dumps(self._data)
+        self._lock.release()
+        # the history is replaced at once, a crash never leaves it half written
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(fd, 'wt') as fout:
+            fout.write(blob)
+        os.replace(tmp, self.path)
+
+
+def _digest(obj):
+    blob = json.dumps(obj, sort_keys=True, default=str)
+    return hashlib.sha256(blob.encode('utf-8')).hexdigest()
@@ -0,0 +1,71 @@
+import os
+import json
+import time
+import hashlib
+
+from threading import Semaphore
+
+
+class Journal(object):
+    """
+    Append-only record of the combinations that completed and their exit codes.
+
+    Each entry is flushed to the OS as soon as it is written, so it survives the death of
+    brun, while fsync (which is what makes it survive a reboot) is called at most once every
+    `sync_interval` seconds.
+    """
+    def __init__(self, path, sync_interval=1.0):
+        self.path = path
+        self.sync_interval = sync_interval
+        self._lock = Semaphore(1)
+        self._file = open(self.path, 'at')
+        # the last entry may have been cut short by a crash, it must not swallow the next one
+        if self._file.tell() > 0 and not _ends_with_newline(self.path):
+            self._file.write('\n')
+        self._last_sync = time.time()
+
+    @staticmethod
+    def identity(values):
+        """Returns the identity of a combination given the values of its fields"""
+        blob = json.dumps(values, sort_keys=True, default=str)
+        return hashlib.sha256(blob.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def load(path):
+        """Returns the identities of the combinations that succeeded according to a journal"""
+        succeeded = set()
+        with open(path, 'rt') as fin:
+            for line in fin:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # truncated entry
+                    continue
+                if entry['returncode'] == 0:
+                    succeeded.add(entry['id'])
+        return succeeded
+
+    def record(self, identity, returncode):
+        entry = json.dumps({'id': identity, 'returncode': returncode})
+        self._lock.acquire()
+        try:
+            self._file.write(entry + '\n')
+            self._file.flush()
+            if time.time() - self._last_sync >= self.sync_interval:
+                os.fsync(self._file.fileno())
+                self._last_sync = time.time()
+        finally:
+            self._lock.release()
+
+    def close(self):
+        self._lock.acquire()
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        self._lock.release()
+
+
+def _ends_with_newline(path):
+    with open(path, 'rb') as fin:
+        fin.seek(-1, os.SEEK_END)
+        return fin.read(1) == b'\n'
@@ -0,0 +1,111 @@
+import os
+import socket
+import socketserver
+
+from threading import Thread
+from http.server import HTTPServer, BaseHTTPRequestHandler
+
+from .remote import parse_address
+
+# (name, type, help, key of the stats)
+METRICS = [
+    ('brun_tasks', 'gauge', 'Number of tasks to run', 'tasks_total'),
+    ('brun_tasks_completed_total', 'counter', 'Tasks completed', 'tasks_completed'),
+    ('brun_tasks_failed_total', 'counter', 'Tasks failed', 'tasks_failed'),
+    ('brun_tasks_aborted_total', 'counter', 'Tasks aborted', 'tasks_aborted'),
+    ('brun_tasks_timedout_total', 'counter', 'Tasks killed after their timeout', 'tasks_timedout'),
+    ('brun_tasks_speculated_total', 'counter', 'Copies of slow tasks started', 'tasks_speculated'),
+    ('brun_tasks_cached_total', 'counter', 'Tasks replayed from the cache', 'tasks_cached'),
+    ('brun_tasks_queued', 'gauge', 'Tasks waiting for a slot', 'tasks_queued'),
+    ('brun_slots', 'gauge', 'Tasks allowed to run at the same time', 'jobs_max'),
+    ('brun_slots_idle', 'gauge', 'Slots not running a task', 'jobs_idle'),
+    ('brun_tasks_per_second', 'gauge', 'Tasks completed per second (sliding window)',
+     'tasks_rate'),
+    ('brun_eta_seconds', 'gauge', 'Expected time to complete the remaining tasks', 'eta'),
+]
+
+
+class MetricsServer(object):
+    """
+    HTTP endpoint (on TCP or on a Unix socket) exporting the stats of a pool in the text
+    format of Prometheus. `collect` returns the stats and the histogram of the durations.
+    """
+    def __init__(self, address, collect):
+        family, addr = parse_address(address)
+        handler = type('_Handler', (_MetricsHandler, ), {'collect': staticmethod(collect)})
+        if family == socket.AF_UNIX:
+            if os.path.exists(addr):
+                os.unlink(addr)
+            self.server = _UnixHTTPServer(addr, handler)
+        else:
+            self.server = _ThreadingHTTPServer(addr, handler)
+        self.server.daemon_threads = True
+        self.thread = Thread(target=self.server.serve_forever, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def render(stats, histogram):
+    lines = []
+    for name, kind, description, key in METRICS:
+        # counters that were never increased are 0, the ETA may be unknown
+        value = stats.get(key, 0)
+        if value is None:
+            continue
+        lines += ['# HELP {} {}'.format(name, description), '# TYPE {} {}'.format(name, kind)]
+        lines.append('{} {}'.format(name, _format(value)))
+    buckets, total = histogram
+    name = 'brun_task_duration_seconds'
+    lines += ['# HELP {} Duration of the tasks'.format(name), '# TYPE {} histogram'.format(name)]
+    for bound, count in buckets:
+        lines.append('{}_bucket{{le="{}"}} {}'.format(name, _format(bound), count))
+    lines.append('{}_sum {}'.format(name, _format(total)))
+    lines.append('{}_count {}'.format(name, buckets[-1][1]))
+    return '\n'.join(lines) + '\n'
+
+
+def _format(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path != '/metrics':
+            self.send_error(404)
+            return
+        body = render(*self.collect()).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        # the console belongs to the tasks
+        pass
+
+
+class _ThreadingHTTPServer(socketserver.ThreadingMixIn, HTTPServer):
+    # http.server.ThreadingHTTPServer is not available before Python 3.7
+    pass
+
+
+class _UnixHTTPServer(_ThreadingHTTPServer):
+    address_family = socket.AF_UNIX
+
+    def server_bind(self):
+        # the name of the host and the port have no meaning for Unix sockets
+        socketserver.TCPServer.server_bind(self)
+        self.server_name = 'localhost'
+        self.server_port = 0
+
+    def get_request(self):
+        request, _ = super(_UnixHTTPServer, self).get_request()
+        return request, ('local', 0)
@@ -1,24 +1,26 @@
 import sys
+import time
 import traceback
 
-from queue import Queue
-from threading import Thread, Event, Semaphore
-from time import sleep
-from collections import defaultdict
+from queue import Queue, Empty
+from bisect import bisect_left
+from threading import Thread, Event, Semaphore, Condition, local
+from collections import defaultdict, deque
 from copy import copy
 
 from brun import brlogger
-from brun.exceptions import TaskFailureError
+from brun.exceptions import TaskFailureError, TaskCancelledError
+from brun.constants import STATS_WINDOW_SECS, STATS_WINDOW_TASKS, STATS_DURATION_BUCKETS
 
 
 class Worker(Thread):
     """Thread executing tasks from a given tasks queue"""
-    def __init__(self, name, queue, results, abort, idle, exception_handler, stats):
+    def __init__(self, name, queue, results, idle, exception_handler, stats, limiter):
         Thread.__init__(self)
         self.name = name
         self.queue = queue
+        self.limiter = limiter
         self.results = results
-        self.abort = abort
         self.idle = idle
         self.exception_handler = exception_handler
         self.stats = stats
@@ -28,17 +30,21 @@ class Worker(Thread):
     """Thread work loop calling the function with the params"""
 
     def run(self):
-        #keep running until told to abort
-        while not self.abort.is_set():
-            try:
-                #get a task and raise immediately if none available
-                func, args, kwargs = self.queue.get(False)
-                self.idle.clear()
-            except:
-                #no work to do
-                self.idle.set()
-                sleep(0.5)
-                continue
+        #keep running until a sentinel is received
+        while True:
+            self.idle.set()
+            #wait for a free slot (the number of slots can change at runtime)
+            self.limiter.acquire()
+            #block until a task (or the sentinel) is available
+            task = self.queue.get()
+            if task is None:
+                self.limiter.release()
+                self.queue.task_done()
+                break
+            self.idle.clear()
+            func, args, kwargs = task
+            started = time.time()
+            cancelled = False
 
             try:
                 #the function may raise
@@ -46,6 +52,10 @@ class Worker(Thread):
                 self.stats.increase('tasks_completed')
                 if (result is not None):
                     self.results.put(result)
+            except TaskCancelledError:
+                #another copy of the task completed first
+                self.stats.increase('tasks_cancelled')
+                cancelled = True
             except TaskFailureError:
                 # get info about the error
                 ex_type, ex, tb = sys.exc_info()
@@ -61,50 +71,56 @@ class Worker(Thread):
                 self.stats.increase('tasks_failed')
                 traceback.print_exception(ex_type, ex, tb, file=sys.stderr)
             finally:
-                #task complete no matter what happened
+                #task complete no matter what happened (the copies killed are not counted)
+                if not cancelled:
+                    self.stats.task_done(time.time() - started)
+                self.limiter.release()
                 self.queue.task_done()
 
 
 class Pool:
     """Pool of threads consuming tasks from a queue"""
-    def __init__(self, thread_count, exception_handler):
-        #batch mode means block when adding tasks if no threads available to process
-        self.queue = Queue()
+    def __init__(self, thread_count, exception_handler, queue_size=0):
+        #a bounded queue blocks the dispatcher when no threads are available to process
+        self.queue = Queue(queue_size)
         self.resultQueue = Queue()
         self.thread_count = thread_count
         self.exception_handler = exception_handler
         self.stats = StatisticsCollector()
-        self.aborts = []
+        self.limiter = Limiter(thread_count)
         self.idles = []
         self.threads = []
+        self.dispatcher = None
+        self.dispatched = Event()
+        self.aborted = Event()
+        # error that stopped the dispatch of the tasks (e.g., invalid command)
+        self.error = None
+        self.finished = Event()
 
     """Tell my threads to quit"""
 
     def __del__(self):
         self.abort()
 
-    """Start the threads, or restart them if you've aborted"""
+    """Start the threads, return False if they are already running"""
 
-    def run(self, block=False):
-        #either wait for them to finish or return false if some arent
-        if block:
-            while self.alive():
-                sleep(1)
-        elif self.alive():
+    def run(self):
+        if self.alive():
             return False
 
         #go start them
-        self.aborts = []
+        self.aborted.clear()
+        self.error = None
+        self.dispatched.clear()
+        self.finished.clear()
         self.idles = []
         self.threads = []
         for n in range(self.thread_count):
-            abort = Event()
             idle = Event()
-            self.aborts.append(abort)
             self.idles.append(idle)
             self.threads.append(
-                Worker('thread-%d' % n, self.queue, self.resultQueue, abort, idle,
-                       self.exception_handler, self.stats))
+                Worker('thread-%d' % n, self.queue, self.resultQueue, idle, self.exception_handler,
+                       self.stats, self.limiter))
         return True
 
     """Add a task to the queue"""
@@ -113,30 +129,87 @@ class Pool:
         self.queue.put((func, args, kargs))
         self.stats.increase('tasks_total')
 
+    """Feed the queue with the tasks generated by an iterable of (func, args, kwargs)"""
+
+    def dispatch(self, tasks):
+        self.dispatcher = Thread(target=self._dispatch, args=(tasks, ), daemon=True)
+        self.dispatcher.start()
+
+    def _dispatch(self, tasks):
+        try:
+            for task in tasks:
+                if self.aborted.is_set():
+                    #the rest of the generator is not consumed
+                    self.stats.increase('tasks_aborted')
+                    break
+                #block until there is room in the queue
+                self.queue.put(task)
+            self.dispatched.set()
+        except Exception as e:
+            self.error = e
+            self.abort()
+        finally:
+            #tasks that made it into the queue after an abort are discarded
+            if self.aborted.is_set():
+                self._clear_queue()
+            self.shutdown()
+
+    """Add a copy of a task that is running to the queue, it is not counted in the total"""
+
+    def duplicate(self, func, *args, **kargs):
+        self.queue.put((func, args, kargs))
+
+    """Returns True if all the tasks were dispatched and none of them is waiting in the queue"""
+
+    def drained(self):
+        return self.dispatched.is_set() and self.queue.empty()
+
+    """Wait for completion of all the tasks in the queue, then tell each worker to quit"""
+
+    def shutdown(self):
+        self.queue.join()
+        #workers waiting for a slot need one to receive their sentinel
+        self.limiter.resize(len(self.threads))
+        for _ in self.threads:
+            self.queue.put(None)
+        for t in self.threads:
+            t.join()
+        self.finished.set()
+
+    """Change the number of workers allowed to run tasks at the same time"""
+
+    def resize(self, count):
+        self.limiter.resize(max(1, min(count, self.thread_count)))
+
+    """Wait for the pool to shutdown, returns False if the timeout expires first"""
+
+    def wait(self, timeout=None):
+        return self.finished.wait(timeout)
+
     """Wait for completion of all the tasks in the queue"""
 
     def join(self):
         self.queue.join()
 
-    """Tell each worker that its done working"""
+    """Drop the tasks that did not start yet, workers finish what they are doing"""
+
+    def abort(self):
+        self.aborted.set()
+        self._clear_queue()
 
-    def abort(self, block=False):
-        #tell the threads to stop after they are done with what they are currently doing
-        for a in self.aborts:
-            a.set()
-        # clear the queue
+    def _clear_queue(self):
         while not self.queue.empty():
             try:
-                _, args, _ = self.queue.get(False)
-                cmd, *_ = args
+                task = self.queue.get(False)
+                if task is None:
+                    #sentinels are never discarded
+                    self.queue.put(None)
+                    self.queue.task_done()
+                    break
                 self.queue.task_done()
-                brlogger.info(':brun: Aborted < {0}'.format(' '.join(cmd)))
                 self.stats.increase('tasks_aborted')
-            except:
+            except Empty:
                 pass
-        #wait for them to finish if requested
-        while block and self.alive():
-            sleep(1)
 
     """Returns True if any threads are currently running"""
 
@@ -148,64 +221,162 @@ class Pool:
     def idle(self):
         return False not in [i.is_set() for i in self.idles]
 
-    """Returns True if not tasks are left to be completed"""
+    """Returns True if the pool shut down after completing all the tasks"""
 
     def done(self):
-        return self.queue.empty()
+        return self.finished.is_set()
 
     """Get the set of results that have been processed, repeatedly call until done"""
 
-    def results(self, wait=0):
-        sleep(wait)
+    def results(self):
         results = []
         try:
             while True:
                 #get a result, raises empty exception immediately if none available
                 results.append(self.resultQueue.get(False))
                 self.resultQueue.task_done()
-        except:
+        except Empty:
             pass
         return results
 
     """Wait for the pool to complete and return the results as soon as they are ready"""
 
     def iterate_results(self):
-        while not self.done() or not self.idle():
-            for r in self.results():
-                yield r
-        for r in self.results():
-            yield r
+        while not self.done() or not self.resultQueue.empty():
+            try:
+                result = self.resultQueue.get(timeout=0.1)
+            except Empty:
+                continue
+            self.resultQueue.task_done()
+            yield result
 
     def get_stats(self):
         stats = self.stats.get_stats()
-        stats['jobs_idle'] = len([1 for i in self.idles if i.is_set()])
-        stats['jobs_max'] = len([1 for t in self.threads if t.is_alive()])
+        alive = len([1 for t in self.threads if t.is_alive()])
+        stats['jobs_max'] = min(alive, self.limiter.limit)
+        busy = len([1 for i in self.idles if not i.is_set()])
+        stats['jobs_idle'] = max(0, stats['jobs_max'] - busy)
         stats['tasks_queued'] = self.queue.qsize()
         return stats
 
 
+class Limiter():
+    """Semaphore whose number of permits can change at runtime"""
+    def __init__(self, limit):
+        self.limit = limit
+        self.taken = 0
+        self.cond = Condition()
+
+    def acquire(self):
+        with self.cond:
+            while self.taken >= self.limit:
+                self.cond.wait()
+            self.taken += 1
+
+    def release(self):
+        with self.cond:
+            self.taken -= 1
+            self.cond.notify_all()
+
+    def resize(self, limit):
+        with self.cond:
+            self.limit = limit
+            self.cond.notify_all()
+
+    """Wait until all the permits are returned"""
+
+    def join(self):
+        with self.cond:
+            while self.taken > 0:
+                self.cond.wait()
+
+
 class StatisticsCollector():
-    def __init__(self):
+    """
+    Counters and durations of the tasks. Each thread updates its own shard of the counters,
+    so that no lock is taken on the hot path, the shards are summed when they are read.
+    """
+    def __init__(self, window=STATS_WINDOW_SECS, buckets=STATS_DURATION_BUCKETS):
         self.lock = Semaphore(1)
-        self.data = defaultdict(lambda: 0)
+        self.base = defaultdict(lambda: 0)
+        self.shards = []
+        self.local = local()
+        self.window = window
+        self.started = time.time()
+        # completion time and duration of the most recent tasks (appends are atomic)
+        self.tasks = deque(maxlen=STATS_WINDOW_TASKS)
+        # upper bounds of the buckets of the histogram of the durations
+        self.buckets = list(buckets)
 
     def set(self, key, value):
         self.lock.acquire()
-        self.data[key] = value
+        self.base[key] = value - self._sum(key)
         self.lock.release()
 
     def increase(self, key):
-        self.lock.acquire()
-        self.data[key] += 1
-        self.lock.release()
+        self._shard()[key] += 1
 
     def decrease(self, key):
-        self.lock.acquire()
-        self.data[key] -= 1
-        self.lock.release()
+        self._shard()[key] -= 1
+
+    def task_done(self, duration):
+        self.tasks.append((time.time(), duration))
+        shard = self._shard()
+        shard[('bucket', bisect_left(self.buckets, duration))] += 1
+        shard['task_duration_sum'] += duration
 
     def get_stats(self):
+        stats = self._collect()
+        stats = defaultdict(lambda: 0, {k: v for k, v in stats.items() if isinstance(k, str)})
+        stats.update(self._get_rates(self.tasks.copy()))
+        return stats
+
+    def get_histogram(self):
+        """Returns the cumulative counts of the durations [(upper_bound, count)], their sum"""
+        stats = self._collect()
+        histogram, count = [], 0
+        for i, bound in enumerate(self.buckets + [float('inf')]):
+            count += stats[('bucket', i)]
+            histogram.append((bound, count))
+        return histogram, stats['task_duration_sum']
+
+    def _shard(self):
+        shard = getattr(self.local, 'shard', None)
+        if shard is None:
+            shard = self.local.shard = defaultdict(lambda: 0)
+            self.lock.acquire()
+            self.shards.append(shard)
+            self.lock.release()
+        return shard
+
+    def _collect(self):
         self.lock.acquire()
-        stats = copy(self.data)
+        # copying a dict is atomic, the owner of a shard can keep updating it
+        shards = [copy(self.base)] + [shard.copy() for shard in self.shards]
         self.lock.release()
+        stats = defaultdict(lambda: 0)
+        for shard in shards:
+            for key, value in shard.items():
+                stats[key] += value
         return stats
+
+    def _sum(self, key):
+        return sum([shard.copy().get(key, 0) for shard in self.shards])
+
+    def get_median_duration(self):
+        """Returns the median duration of the most recent tasks, None if none completed"""
+        durations = sorted([d for _, d in self.tasks.copy()])
+        return durations[len(durations) // 2] if durations else None
+
+    def _get_rates(self, tasks):
+        """Throughput and durations of the tasks completed within the sliding window"""
+        now = time.time()
+        since = max(now - self.window, self.started)
+        durations = sorted([d for t, d in tasks if t >= since])
+        if not durations:
+            return {'tasks_rate': 0.0, 'task_duration_mean': 0.0, 'task_duration_p95': 0.0}
+        return {
+            'tasks_rate': len(durations) / max(now - since, 1e-3),
+            'task_duration_mean': sum(durations) / len(durations),
+            'task_duration_p95': durations[int(0.95 * (len(durations) - 1))]
+        }
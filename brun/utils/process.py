@@ -0,0 +1,9 @@
+import os
+
+
+def killpg(pgid, sig):
+    """Sends a signal to a process group, nothing happens if the group is gone already"""
+    try:
+        os.killpg(pgid, sig)
+    except ProcessLookupError:
+        pass
@@ -0,0 +1,313 @@
+import os
+import sys
+import json
+import time
+import socket
+import itertools
+import traceback
+
+from queue import Queue, Empty
+from threading import Thread, Event, Condition, Semaphore
+
+from brun import brlogger
+from brun.exceptions import TaskFailureError
+from brun.constants import AGENT_TIMEOUT_SECS, AGENT_TOKEN_ENV, TIMEOUT_GRACE_SECS
+from .pool import StatisticsCollector
+
+
+class RemotePool:
+    """
+    Pool of the slots offered by remote agents (see brun-agent).
+
+    Tasks are sent to the agent with the most free slots, each agent runs them with a local
+    pool and sends back their results. An agent that stops sending heartbeats is considered
+    lost, its tasks are sent to the other agents.
+    """
+    def __init__(self, addresses, exception_handler, token, shell=True, grace=TIMEOUT_GRACE_SECS):
+        self.exception_handler = exception_handler
+        self.shell = shell
+        self.grace = grace
+        self.resultQueue = Queue()
+        self.stats = StatisticsCollector()
+        self.cond = Condition()
+        self.pending = dict()
+        self.running = 0
+        self.ids = itertools.count()
+        self.dispatcher = None
+        self.aborted = Event()
+        # error that stopped the dispatch of the tasks (e.g., invalid command)
+        self.error = None
+        self.finished = Event()
+        self.agents = [_RemoteAgent(address, token) for address in addresses]
+        self.slot_count = sum([a.slots for a in self.agents])
+
+    """Start receiving from the agents, return False if it is already running"""
+
+    def run(self):
+        if True in [a.reader is not None for a in self.agents]:
+            return False
+        self.aborted.clear()
+        self.error = None
+        self.finished.clear()
+        for agent in self.agents:
+            agent.reader = Thread(target=self._receive, args=(agent, ), daemon=True)
+            agent.reader.start()
+        return True
+
+    """Send the tasks generated by an iterable of (func, args, kwargs) to the agents"""
+
+    def dispatch(self, tasks):
+        self.dispatcher = Thread(target=self._dispatch, args=(tasks, ), daemon=True)
+        self.dispatcher.start()
+
+    def _dispatch(self, tasks):
+        try:
+            for task in tasks:
+                if self.aborted.is_set():
+                    #the rest of the generator is not consumed
+                    self.stats.increase('tasks_aborted')
+                    break
+                with self.cond:
+                    self.running += 1
+                self._send(task)
+        except Exception as e:
+            self.error = e
+            self.abort()
+        finally:
+            self.shutdown()
+
+    def _send(self, task):
+        _, args, kwargs = task
+        cmd, *_ = args
+        with self.cond:
+            # block until an agent has a free slot
+            while True:
+                agents = [a for a in self.agents if a.alive]
+                if not agents:
+                    self.running -= 1
+                    self.cond.notify_all()
+                    raise RuntimeError('No agents available to run {}'.format(' '.join(cmd)))
+                free = [a for a in agents if a.free > 0]
+                if free:
+                    break
+                self.cond.wait()
+            agent = max(free, key=lambda a: a.free)
+            agent.free -= 1
+            task_id = next(self.ids)
+            self.pending[task_id] = (agent, task, time.time())
+        try:
+            agent.send({
+                'type': 'task',
+                'id': task_id,
+                'cmd': cmd,
+                'shell': self.shell,
+                'timeout': kwargs.get('timeout'),
+                'grace': self.grace
+            })
+        except OSError:
+            # the reader of the agent notices that it is gone and sends its tasks elsewhere
+            pass
+
+    def _resend(self, tasks):
+        for task in tasks:
+            try:
+                self._send(task)
+            except Exception as e:
+                self.error = e
+                self.stats.increase('tasks_failed')
+                self.abort()
+
+    def _receive(self, agent):
+        try:
+            for message in agent.messages():
+                if message['type'] == 'heartbeat':
+                    agent.stats = message['stats']
+                elif message['type'] == 'result':
+                    with self.cond:
+                        _, task, sent = self.pending.pop(message['id'])
+                        agent.free += 1
+                        self.cond.notify_all()
+                    self.stats.task_done(time.time() - sent)
+                    self._complete(agent, task, message)
+        except (OSError, ValueError) as e:
+            if not agent.closing:
+                brlogger.warning('Lost agent {}. {}'.format(agent.name, e))
+        finally:
+            with self.cond:
+                agent.alive = False
+                # the tasks of a lost agent go to the other agents
+                lost = [k for k, (a, _, _) in self.pending.items() if a is agent]
+                tasks = [self.pending.pop(k)[1] for k in lost]
+                self.cond.notify_all()
+            if tasks:
+                Thread(target=self._resend, args=(tasks, ), daemon=True).start()
+
+    def _complete(self, agent, task, reply):
+        func, args, kwargs = task
+        try:
+            #the function may raise
+            result = func(*args, reply, **kwargs)
+            self.stats.increase('tasks_completed')
+            if (result is not None):
+                self.resultQueue.put(result)
+        except TaskFailureError:
+            ex_type, ex, tb = sys.exc_info()
+            # get partial results and errors
+            result = ex.result
+            if (result is not None):
+                self.resultQueue.put(result)
+            self.stats.increase('tasks_failed')
+            self.exception_handler(agent.name, ex_type, ex, tb, args, kwargs)
+        except:
+            ex_type, ex, tb = sys.exc_info()
+            self.stats.increase('tasks_failed')
+            traceback.print_exception(ex_type, ex, tb, file=sys.stderr)
+        finally:
+            with self.cond:
+                self.running -= 1
+                self.cond.notify_all()
+
+    """Wait for the results of all the tasks sent, then disconnect from the agents"""
+
+    def shutdown(self):
+        with self.cond:
+            while self.running > 0:
+                self.cond.wait()
+        for agent in self.agents:
+            agent.close()
+        for agent in self.agents:
+            if agent.reader is not None:
+                agent.reader.join()
+            agent.disconnect()
+        self.finished.set()
+
+    """The number of slots is decided by the agents"""
+
+    def resize(self, count):
+        pass
+
+    """Wait for the pool to shutdown, returns False if the timeout expires first"""
+
+    def wait(self, timeout=None):
+        return self.finished.wait(timeout)
+
+    """Stop sending new tasks, tasks sent already are not interrupted"""
+
+    def abort(self):
+        self.aborted.set()
+
+    """Returns True if any agents are connected"""
+
+    def alive(self):
+        return True in [a.alive for a in self.agents]
+
+    """Returns True if no tasks are running"""
+
+    def idle(self):
+        return self.running == 0
+
+    """Returns True if the pool shut down after completing all the tasks"""
+
+    def done(self):
+        return self.finished.is_set()
+
+    """Get the set of results that have been processed, repeatedly call until done"""
+
+    def results(self):
+        results = []
+        try:
+            while True:
+                results.append(self.resultQueue.get(False))
+                self.resultQueue.task_done()
+        except Empty:
+            pass
+        return results
+
+    def get_stats(self):
+        stats = self.stats.get_stats()
+        agents = [a for a in self.agents if a.alive]
+        stats['jobs_max'] = sum([a.slots for a in agents])
+        stats['jobs_idle'] = sum([a.free for a in agents])
+        stats['tasks_queued'] = 0
+        stats['agents_alive'] = len(agents)
+        return stats
+
+
+class _RemoteAgent(object):
+    """Connection to an agent"""
+    def __init__(self, address, token):
+        self.name = address
+        self.socket = connect(address)
+        # an agent sends heartbeats, silence means that it is gone
+        self.socket.settimeout(AGENT_TIMEOUT_SECS)
+        self._rfile = self.socket.makefile('rb')
+        self._lock = Semaphore(1)
+        self.send({'type': 'auth', 'token': token})
+        hello = json.loads(self._rfile.readline().decode('utf-8') or 'null')
+        if not hello or hello['type'] != 'hello':
+            self.disconnect()
+            raise ValueError('The agent {} refused the token'.format(address))
+        self.slots = hello['slots']
+        self.free = self.slots
+        self.stats = dict()
+        self.alive = True
+        self.closing = False
+        self.reader = None
+
+    def send(self, message):
+        send(self.socket, self._lock, message)
+
+    def messages(self):
+        for line in iter(self._rfile.readline, b''):
+            yield json.loads(line.decode('utf-8'))
+
+    def close(self):
+        self.closing = True
+        try:
+            # the agent sees the end of the stream, completes its tasks and disconnects
+            self.socket.shutdown(socket.SHUT_WR)
+        except OSError:
+            pass
+
+    def disconnect(self):
+        self._rfile.close()
+        self.socket.close()
+
+
+def parse_address(address):
+    """Turns 'host:port' or 'unix:/path/to/socket' into a socket family and address"""
+    if address.startswith('unix:'):
+        return socket.AF_UNIX, address[len('unix:'):]
+    host, sep, port = address.rpartition(':')
+    if not sep or not port.isdigit():
+        msg = "Invalid address '{}', expected 'host:port' or 'unix:path'".format(address)
+        raise ValueError(msg)
+    # only local clients, unless a host is given explicitly
+    return socket.AF_INET, (host or '127.0.0.1', int(port))
+
+
+def read_token(path=None):
+    """Returns the token in the file or in the environment, None if there is none"""
+    if path is not None:
+        with open(path, 'rt') as fin:
+            return fin.read().strip() or None
+    return os.environ.get(AGENT_TOKEN_ENV) or None
+
+
+def connect(address):
+    family, addr = parse_address(address)
+    if family == socket.AF_UNIX:
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        sock.connect(addr)
+        return sock
+    return socket.create_connection(addr)
+
+
+def send(sock, lock, message):
+    """Sends a message (one line of JSON), the lock makes the write atomic among threads"""
+    data = (json.dumps(message) + '\n').encode('utf-8')
+    lock.acquire()
+    try:
+        sock.sendall(data)
+    finally:
+        lock.release()
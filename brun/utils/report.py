@@ -0,0 +1,65 @@
+import csv
+import json
+
+from threading import Semaphore
+
+# resources used by a task, as returned by getrusage(2) plus the wall time
+USAGE_FIELDS = ['wall', 'user', 'sys', 'maxrss', 'inblock', 'oublock', 'nvcsw', 'nivcsw']
+
+# figures summarized at the end of a run
+SUMMARY_FIELDS = ['wall', 'user', 'sys', 'maxrss']
+
+
+class TaskReport(object):
+    """
+    Writes the resources used by each task to a CSV file (or JSON Lines, if the name of the
+    file ends with .json or .jsonl), one row per task keyed by the values of the fields.
+    """
+    def __init__(self, path, fields):
+        self.path = path
+        self.fields = fields
+        self.json = path.endswith('.json') or path.endswith('.jsonl')
+        self._lock = Semaphore(1)
+        self._file = open(self.path, 'wt', newline='')
+        self._writer = None
+        if not self.json:
+            columns = self.fields + ['returncode'] + USAGE_FIELDS + ['command']
+            self._writer = csv.DictWriter(self._file, columns)
+            self._writer.writeheader()
+        # the figures of all the tasks, used for the summary
+        self._figures = {f: [] for f in SUMMARY_FIELDS}
+        # tasks that ran but whose maxrss is not known (below the RSS of brun)
+        self.maxrss_unknown = 0
+
+    def write(self, values, command, returncode, usage):
+        row = dict(values)
+        row['returncode'] = returncode
+        row.update(usage or {f: None for f in USAGE_FIELDS})
+        row['command'] = command
+        self._lock.acquire()
+        try:
+            if self.json:
+                self._file.write(json.dumps(row, default=str) + '\n')
+            else:
+                self._writer.writerow(row)
+            for f in SUMMARY_FIELDS:
+                if row[f] is not None:
+                    self._figures[f].append(row[f])
+            if usage is not None and usage['maxrss'] is None:
+                self.maxrss_unknown += 1
+        finally:
+            self._lock.release()
+
+    def summary(self):
+        """Returns {figure: (p50, p95, max)} of the tasks written so far"""
+        summary = dict()
+        for f, values in self._figures.items():
+            if not values:
+                continue
+            values = sorted(values)
+            percentile = lambda p: values[int(p * (len(values) - 1))]
+            summary[f] = (percentile(0.5), percentile(0.95), values[-1])
+        return summary
+
+    def close(self):
+        self._file.close()
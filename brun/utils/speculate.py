@@ -0,0 +1,102 @@
+import time
+import signal
+
+from threading import Thread, Event, Semaphore
+
+from brun import brlogger
+from .process import killpg
+
+
+class Speculator(Thread):
+    """
+    Starts a copy of the tasks that run longer than `multiple` times the median duration once
+    all the tasks were dispatched, on the slots that are idle. The first copy to end wins,
+    the process group of the other one is killed. Tasks must be idempotent.
+    """
+    def __init__(self, pool, multiple, interval=0.5):
+        Thread.__init__(self)
+        self.daemon = True
+        self.pool = pool
+        self.multiple = multiple
+        self.interval = interval
+        self.lock = Semaphore(1)
+        self.entries = dict()
+        self.stopped = Event()
+
+    """Register an attempt to run a task, returns None if the task is not running anymore"""
+
+    def register(self, key, pgid, task, speculative=False):
+        self.lock.acquire()
+        try:
+            entry = self.entries.get(key)
+            if entry is None:
+                if speculative:
+                    # the original completed while its copy was waiting in the queue
+                    return None
+                entry = self.entries[key] = _Entry(key, task)
+            attempt = _Attempt(entry, pgid)
+            entry.attempts.append(attempt)
+            return attempt
+        finally:
+            self.lock.release()
+
+    """Returns True if the attempt is the first one to end, the other attempts are killed"""
+
+    def finish(self, attempt):
+        self.lock.acquire()
+        try:
+            entry = attempt.entry
+            if entry.winner is not None:
+                return False
+            entry.winner = attempt
+            del self.entries[entry.key]
+            for other in entry.attempts:
+                if other is not attempt:
+                    killpg(other.pgid, signal.SIGKILL)
+            return True
+        finally:
+            self.lock.release()
+
+    def stop(self):
+        self.stopped.set()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            # only once there is nothing else to run
+            if not self.pool.drained() or self.pool.aborted.is_set():
+                continue
+            idle = self.pool.get_stats()['jobs_idle']
+            median = self.pool.stats.get_median_duration()
+            if idle == 0 or not median:
+                continue
+            threshold = time.time() - self.multiple * median
+            self.lock.acquire()
+            stragglers = [e for e in self.entries.values() \
+                          if not e.duplicated and e.started < threshold]
+            # the oldest ones first
+            stragglers = sorted(stragglers, key=lambda e: e.started)[:idle]
+            for entry in stragglers:
+                # the copy registers only once it starts
+                entry.duplicated = True
+            self.lock.release()
+            for entry in stragglers:
+                func, args, kwargs = entry.task
+                brlogger.info(':brun: Speculating > {0}'.format(' '.join(args[0])))
+                self.pool.stats.increase('tasks_speculated')
+                self.pool.duplicate(func, *args, **dict(kwargs, speculative=True))
+
+
+class _Entry(object):
+    def __init__(self, key, task):
+        self.key = key
+        self.task = task
+        self.started = time.time()
+        self.attempts = []
+        self.duplicated = False
+        self.winner = None
+
+
+class _Attempt(object):
+    def __init__(self, entry, pgid):
+        self.entry = entry
+        self.pgid = pgid
@@ -0,0 +1,55 @@
+import os
+import gzip
+
+from collections import deque
+from threading import Semaphore
+
+
+class OutputSpool(object):
+    """Writes the output streams of each task to their own files in a directory"""
+    def __init__(self, directory, compress=False, tail=20):
+        self.directory = directory
+        self.compress = compress
+        self.tail = tail
+        os.makedirs(self.directory, exist_ok=True)
+        # the index maps task IDs to commands
+        self._lock = Semaphore(1)
+        self._index = open(os.path.join(self.directory, 'index.tsv'), 'at')
+
+    def path(self, task_id, stream):
+        ext = '.gz' if self.compress else ''
+        return os.path.join(self.directory, '{:06d}.{}{}'.format(task_id, stream, ext))
+
+    def open(self, task_id, cmd_str):
+        self._lock.acquire()
+        self._index.write('{:d}\t{:s}\n'.format(task_id, cmd_str))
+        self._index.flush()
+        self._lock.release()
+        return SpooledOutput(self, task_id, 'stdout'), SpooledOutput(self, task_id, 'stderr')
+
+    def close(self):
+        self._index.close()
+
+
+class SpooledOutput(object):
+    """Output stream of a task, only its last lines are kept in memory"""
+    def __init__(self, spool, task_id, stream):
+        self.path = spool.path(task_id, stream)
+        self._file = None
+        self._open = (lambda: gzip.open(self.path, 'wt')) if spool.compress else \
+            (lambda: open(self.path, 'wt'))
+        self._tail = deque(maxlen=spool.tail)
+
+    def write(self, line):
+        # files are created on the first line, silent tasks leave nothing behind
+        if self._file is None:
+            self._file = self._open()
+        self._file.write(line + '\n')
+        self._tail.append(line)
+
+    def tail(self):
+        return '\n'.join(self._tail)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
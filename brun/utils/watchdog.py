@@ -0,0 +1,76 @@
+import time
+import heapq
+import signal
+import itertools
+
+from threading import Thread, Condition
+
+from .process import killpg
+
+
+class Watchdog(Thread):
+    """
+    Kills the process groups of the tasks that run longer than their timeout. A group gets
+    SIGTERM first and SIGKILL if it is still there after a grace period, which also reaches
+    the children that a task left behind.
+    """
+    def __init__(self, grace):
+        Thread.__init__(self)
+        self.daemon = True
+        self.grace = grace
+        self.cond = Condition()
+        # (deadline, sequence number, deadline handle)
+        self.heap = []
+        self.counter = itertools.count()
+        self.stopped = False
+
+    """Start watching a process group, returns a handle to pass to `cancel`"""
+
+    def watch(self, pgid, timeout):
+        deadline = _Deadline(pgid)
+        self._push(time.time() + timeout, deadline)
+        return deadline
+
+    """Stop watching a process group (e.g., its task completed)"""
+
+    def cancel(self, deadline):
+        # cancelled deadlines are dropped when they expire
+        deadline.cancelled = True
+
+    def stop(self):
+        with self.cond:
+            self.stopped = True
+            self.cond.notify_all()
+
+    def run(self):
+        with self.cond:
+            while not self.stopped:
+                if not self.heap:
+                    self.cond.wait()
+                    continue
+                when, _, deadline = self.heap[0]
+                if when > time.time():
+                    self.cond.wait(when - time.time())
+                    continue
+                heapq.heappop(self.heap)
+                if deadline.cancelled:
+                    continue
+                if not deadline.timed_out:
+                    deadline.timed_out = True
+                    killpg(deadline.pgid, signal.SIGTERM)
+                    heapq.heappush(self.heap,
+                                   (time.time() + self.grace, next(self.counter), deadline))
+                else:
+                    killpg(deadline.pgid, signal.SIGKILL)
+
+    def _push(self, when, deadline):
+        with self.cond:
+            heapq.heappush(self.heap, (when, next(self.counter), deadline))
+            self.cond.notify_all()
+
+
+class _Deadline(object):
+    def __init__(self, pgid):
+        self.pgid = pgid
+        self.timed_out = False
+        self.cancelled = False
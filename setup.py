@@ -41,8 +41,8 @@ setup(
     zip_safe=False,
     include_package_data=True,
     keywords=['batch', 'parameterized', 'commands', 'shell'],
-    install_requires=['networkx'],
-    scripts=['brun/brun'],
+    install_requires=[],
+    scripts=['brun/brun', 'brun/brun-agent'],
     classifiers=[
         'Development Status :: 3 - Alpha',
         'Intended Audience :: Developers',
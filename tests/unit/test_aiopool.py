@@ -0,0 +1,109 @@
+import time
+import asyncio
+import itertools
+import resource
+import unittest
+
+from brun.utils.aiopool import AsyncPool, FDS_PER_SLOT
+from brun.exceptions import TaskFailureError
+
+
+async def _task(cmd, duration=0):
+    await asyncio.sleep(duration)
+    return cmd
+
+
+async def _failing_task(cmd):
+    raise TaskFailureError('The command {} failed.'.format(cmd), cmd)
+
+
+async def _subprocess_task(cmd):
+    process = await asyncio.create_subprocess_exec(*cmd, stdout=asyncio.subprocess.PIPE)
+    stdout, _ = await process.communicate()
+    return stdout.decode().strip()
+
+
+class TestAsyncPool(unittest.TestCase):
+    def _get_pool(self, slot_count):
+        self.errors = []
+        handler = lambda *args: self.errors.append(args)
+        return AsyncPool(slot_count, handler)
+
+    def test_dispatch(self):
+        pool = self._get_pool(4)
+        pool.run()
+        pool.dispatch((_task, (['echo', str(i)], ), {}) for i in range(100))
+        self.assertTrue(pool.wait(5))
+        self.assertFalse(pool.alive())
+        self.assertEqual(100, len(pool.results()))
+        self.assertEqual(100, pool.get_stats()['tasks_completed'])
+
+    def test_subprocess(self):
+        pool = self._get_pool(4)
+        pool.run()
+        pool.dispatch((_subprocess_task, (['echo', str(i)], ), {}) for i in range(10))
+        self.assertTrue(pool.wait(5))
+        self.assertEqual([str(i) for i in range(10)], sorted(pool.results(), key=int))
+
+    def test_failure(self):
+        pool = self._get_pool(2)
+        pool.run()
+        pool.dispatch((_failing_task, (['false'], ), {}) for _ in range(3))
+        self.assertTrue(pool.wait(5))
+        self.assertEqual(3, pool.get_stats()['tasks_failed'])
+        self.assertEqual(3, len(self.errors))
+
+    def test_abort(self):
+        pool = self._get_pool(1)
+        pool.run()
+        generated = itertools.count()
+        pool.dispatch((_task, (['sleep'], 0.2), {}) for _ in generated)
+        time.sleep(0.1)
+        pool.abort()
+        self.assertTrue(pool.wait(5))
+        stats = pool.get_stats()
+        self.assertEqual(1, stats['tasks_completed'])
+        # the generator is not consumed after the abort, the tasks taken from it are counted
+        self.assertEqual(next(generated), stats['tasks_completed'] + stats['tasks_aborted'])
+
+    def test_resize(self):
+        pool = self._get_pool(4)
+        running = {'now': 0, 'max': 0}
+
+        async def _counting_task(cmd):
+            running['now'] += 1
+            running['max'] = max(running['max'], running['now'])
+            await asyncio.sleep(0.01)
+            running['now'] -= 1
+
+        pool.resize(1)
+        pool.run()
+        pool.dispatch((_counting_task, (['echo'], ), {}) for _ in range(20))
+        self.assertTrue(pool.wait(5))
+        self.assertEqual(1, running['max'])
+        self.assertEqual(20, pool.get_stats()['tasks_completed'])
+
+    def test_wait_timeout(self):
+        pool = self._get_pool(2)
+        pool.run()
+        pool.dispatch((_task, (['sleep'], 0.3), {}) for _ in range(2))
+        self.assertFalse(pool.wait(0.05))
+        self.assertTrue(pool.alive())
+        self.assertTrue(pool.wait(5))
+
+    def test_global_state(self):
+        limits = resource.getrlimit(resource.RLIMIT_NOFILE)
+        policy = asyncio.get_event_loop_policy()
+        watcher = policy._watcher if hasattr(policy, '_watcher') else None
+        pool = self._get_pool(limits[0] // FDS_PER_SLOT + 1)
+        pool.run()
+        pool.dispatch([])
+        self.assertTrue(pool.wait(5))
+        # the limits and the child watcher are restored on shutdown
+        self.assertEqual(limits, resource.getrlimit(resource.RLIMIT_NOFILE))
+        if watcher is not None:
+            self.assertIs(watcher, policy._watcher)
+
+
+if __name__ == '__main__':
+    unittest.main()
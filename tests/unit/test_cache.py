@@ -0,0 +1,56 @@
+import os
+import time
+import shutil
+import tempfile
+import unittest
+
+from brun.utils import ResultCache
+
+
+class TestCache(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_cache(self):
+        cache = ResultCache(os.path.join(self.directory, 'cache'), 1024)
+        key = cache.key('echo 1')
+        self.assertIsNone(cache.get(key))
+        cache.put(key, 0, ['1'], [])
+        self.assertEqual({'returncode': 0, 'stdout': ['1'], 'stderr': []}, cache.get(key))
+        self.assertNotEqual(key, cache.key('echo 2'))
+        # entries survive across runs
+        cache = ResultCache(os.path.join(self.directory, 'cache'), 1024)
+        self.assertEqual(['1'], cache.get(key)['stdout'])
+
+    def test_cache_inputs(self):
+        cache = ResultCache(os.path.join(self.directory, 'cache'), 1024)
+        path = os.path.join(self.directory, 'input')
+        self.assertIsNone(cache.key('cat input', [path]))
+        with open(path, 'wt') as fout:
+            fout.write('a')
+        key = cache.key('cat input', [path])
+        self.assertEqual(key, cache.key('cat input', [path]))
+        with open(path, 'wt') as fout:
+            fout.write('bb')
+        self.assertNotEqual(key, cache.key('cat input', [path]))
+
+    def test_cache_eviction(self):
+        cache = ResultCache(os.path.join(self.directory, 'cache'), 300)
+        keys = [cache.key('echo {}'.format(i)) for i in range(4)]
+        for key in keys[:3]:
+            cache.put(key, 0, ['x' * 50], [])
+            time.sleep(0.01)
+        # the first entry is used recently, the second one is evicted
+        cache.get(keys[0])
+        cache.put(keys[3], 0, ['x' * 50], [])
+        self.assertLessEqual(cache.size, 300)
+        self.assertIsNotNone(cache.get(keys[0]))
+        self.assertIsNone(cache.get(keys[1]))
+        self.assertIsNotNone(cache.get(keys[3]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,9 +1,11 @@
 import os
+import sys
 import brun
 import unittest
 from itertools import product
 from functools import reduce
 
+from brun.exceptions import InvalidConfigurationError
 from utils import IterableNamespace, get_sandbox
 
 
@@ -50,6 +52,103 @@ class TestConfig(unittest.TestCase):
         commands1, commands2 = _get_commands(self, fields, command)
         self.assertEqual(commands1, commands2)
 
+    def test_lazy_len(self):
+        fields = [('x', 'range', [1000]), ('y', 'range', [1000]), ('z', 'range', [1000])]
+        cfg = self._get_config(fields)
+        self.assertEqual(1000**3, len(cfg))
+
+    def test_lazy_iter(self):
+        fields = [('x', 'range', [1000]), ('y', 'range', [1000]), ('z', 'range', [1000])]
+        cfg = self._get_config(fields)
+        cc = next(iter(cfg))
+        self.assertEqual('0 0 0', ' '.join(cc.apply(['{x}', '{y}', '{z}'])))
+
+    def test_lazy_zip_len(self):
+        fields = [('x', 'list', [1, 2, 3]), ('y', 'list', [4, 5]), ('z', 'list', [6, 7])]
+        cfg = self._get_config(fields, group=['zip:x,y'])
+        self.assertEqual(4, len(cfg))
+        self.assertEqual(4, len(list(cfg)))
+
+    def test_lazy_zipl_len(self):
+        fields = [('x', 'list', [1, 2, 3]), ('y', 'list', [4, 5])]
+        cfg = self._get_config(fields, group=['zipl:x,y:0'])
+        self.assertEqual(3, len(cfg))
+        self.assertEqual(3, len(list(cfg)))
+
+    def test_streamed_field(self):
+        r, w = os.pipe()
+        with os.fdopen(r, 'rt') as fin, os.fdopen(w, 'wt') as fout:
+            fout.write('a;b')
+            fout.close()
+            stdin, sys.stdin = sys.stdin, fin
+            try:
+                fields = [('x', 'stdin', [';']), ('y', 'list', [1, 2])]
+                cfg = self._get_config(fields)
+            finally:
+                sys.stdin = stdin
+            self.assertIsNone(cfg.size())
+            self.assertRaises(TypeError, len, cfg)
+            commands = [' '.join(c.apply(['{x}', '{y}'])) for c in cfg]
+            self.assertEqual(['a 1', 'a 2', 'b 1', 'b 2'], commands)
+
+    def test_streamed_field_crossed(self):
+        r, w = os.pipe()
+        with os.fdopen(r, 'rt') as fin, os.fdopen(w, 'wt'):
+            stdin, sys.stdin = sys.stdin, fin
+            try:
+                fields = [('a', 'list', [1, 2]), ('x', 'stdin', [';']), ('y', 'list', [1, 2])]
+                self.assertRaises(InvalidConfigurationError, self._get_config, fields)
+            finally:
+                sys.stdin = stdin
+
+    def test_batch(self):
+        fields = [('x', 'range', [7])]
+        command = 'echo {x...}'.split(' ')
+        cfg = self._get_config(fields)
+        commands = [' '.join(b.apply(command)) for b in brun.lib.batch(cfg, command, size=3)]
+        self.assertEqual(['echo 0 1 2', 'echo 3 4 5', 'echo 6'], commands)
+
+    def test_batch_fixed_fields(self):
+        fields = [('x', 'range', [3]), ('y', 'list', ['a', 'b'])]
+        command = 'echo {y} {x...}'.split(' ')
+        cfg = self._get_config(fields)
+        commands = [' '.join(b.apply(command)) for b in brun.lib.batch(cfg, command)]
+        self.assertEqual(['echo a 0 1 2', 'echo b 0 1 2'], commands)
+
+    def test_batch_max_bytes(self):
+        fields = [('x', 'range', [100000])]
+        command = 'echo {x...}'.split(' ')
+        cfg = self._get_config(fields)
+        batches = list(brun.lib.batch(cfg, command))
+        self.assertGreater(len(batches), 1)
+        self.assertEqual(len(cfg), sum([len(b.members) for b in batches]))
+        for b in batches:
+            self.assertLess(len(' '.join(b.apply(command))), brun.constants.MAX_ARG_STRLEN)
+
+    def test_batch_no_list_placeholder(self):
+        fields = [('x', 'range', [3])]
+        cfg = self._get_config(fields)
+        batches = brun.lib.batch(cfg, ['echo', '{x}'])
+        self.assertRaises(brun.lib.CLISyntaxError, list, batches)
+
+    def test_shard(self):
+        fields = [('x', 'range', [10])]
+        cfg = self._get_config(fields)
+        for strategy in ['strided', 'block']:
+            shards = [brun.lib.shard('{}/3'.format(i), strategy, cfg.size()) for i in [1, 2, 3]]
+            ids = [[c.id for c in cfg.select(s)] for s in shards]
+            # every combination is in exactly one shard
+            self.assertEqual(list(range(10)), sorted(sum(ids, [])))
+        strided = brun.lib.shard('1/3', 'strided')
+        self.assertEqual([0, 3, 6, 9], [c.id for c in cfg.select(strided)])
+        block = brun.lib.shard('1/4', 'block', 10)
+        self.assertEqual(['0', '1'], [c.get('x') for c in cfg.select(block)])
+
+    def test_shard_invalid(self):
+        for shard_str in ['0/3', '4/3', '1', 'a/b']:
+            self.assertRaises(brun.lib.CLISyntaxError, brun.lib.shard, shard_str, 'strided', 10)
+        self.assertRaises(brun.lib.CLISyntaxError, brun.lib.shard, '1/3', 'block', None)
+
 
 def _get_commands(test, fields, command):
     cfg = test._get_config(fields)
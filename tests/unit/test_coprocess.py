@@ -0,0 +1,46 @@
+import unittest
+
+from brun.utils import ShellCoprocess
+
+
+class TestCoprocess(unittest.TestCase):
+    def setUp(self):
+        self.shell = ShellCoprocess()
+
+    def tearDown(self):
+        self.shell.close()
+
+    def _run(self, cmd):
+        stdout, stderr = [], []
+        returncode = self.shell.run(cmd, stdout.append, stderr.append)
+        return returncode, stdout, stderr
+
+    def test_output(self):
+        self.assertEqual((0, ['a', '', 'b'], ['e']), self._run('printf "a\\n\\nb\\n"; echo e >&2'))
+
+    def test_output_no_newline(self):
+        self.assertEqual((0, ['a'], []), self._run('printf a'))
+
+    def test_no_output(self):
+        self.assertEqual((0, [], []), self._run('true'))
+
+    def test_returncode(self):
+        self.assertEqual(3, self._run('(exit 3)')[0])
+        self.assertEqual(0, self._run('true')[0])
+
+    def test_syntax_error(self):
+        self.assertEqual(2, self._run('echo (')[0])
+        self.assertEqual((0, ['alive'], []), self._run('echo alive'))
+
+    def test_exit(self):
+        self.assertEqual((4, ['bye'], []), self._run('echo bye; exit 4'))
+        self.assertEqual((0, ['alive'], []), self._run('echo alive'))
+
+    def test_cwd(self):
+        _, cwd, _ = self._run('pwd')
+        self._run('cd /')
+        self.assertEqual(cwd, self._run('pwd')[1])
+
+
+if __name__ == '__main__':
+    unittest.main()
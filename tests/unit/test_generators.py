@@ -1,9 +1,11 @@
+import os
 import unittest
 import brun
 from utils import stringify, get_sandbox, get_sandbox_object
 from datetime import datetime
 
 from brun.generators.json import JSONInputError
+from brun.generators.stdin import StdinStream
 from json.decoder import JSONDecodeError
 
 
@@ -64,22 +66,67 @@ class TestGenerators(unittest.TestCase):
     def test_gen_file_empty_file(self):
         gen = self._get_generator('file')
         filepath = get_sandbox_object(1, 'f0.ini')
-        self.assertEqual([], gen([filepath]))
+        self.assertEqual([], list(gen([filepath])))
 
     def test_gen_file_oneline_file(self):
         gen = self._get_generator('file')
         filepath = get_sandbox_object(1, 'f1.txt')
-        self.assertEqual(['line1'], gen([filepath]))
+        self.assertEqual(['line1'], list(gen([filepath])))
 
     def test_gen_file_twoline_file(self):
         gen = self._get_generator('file')
         filepath = get_sandbox_object(1, 'f2.txt')
-        self.assertEqual(['line1', 'line2'], gen([filepath]))
+        self.assertEqual(['line1', 'line2'], list(gen([filepath])))
 
     def test_gen_file_full(self):
         gen = self._get_generator('file')
         filepath = get_sandbox_object(1, 'f3.dat')
-        self.assertEqual(['line1', 'line2', 'line3'], gen([filepath]))
+        self.assertEqual(['line1', 'line2', 'line3'], list(gen([filepath])))
+
+    def test_gen_file_len(self):
+        gen = self._get_generator('file')
+        self.assertEqual(0, len(gen([get_sandbox_object(1, 'f0.ini')])))
+        self.assertEqual(3, len(gen([get_sandbox_object(1, 'f3.dat')])))
+
+    def test_gen_file_random_access(self):
+        gen = self._get_generator('file')
+        lines = gen([get_sandbox_object(1, 'f3.dat')])
+        self.assertEqual('line3', lines[2])
+        self.assertEqual('line3', lines[-1])
+        self.assertEqual('line1', lines[0])
+        self.assertEqual(['line2', 'line3'], lines[1:])
+        self.assertRaises(IndexError, lambda: lines[3])
+
+    # Generator: Stdin
+
+    def _get_pipe(self):
+        r, w = os.pipe()
+        return os.fdopen(r, 'rt'), os.fdopen(w, 'wt')
+
+    def test_gen_stdin_full(self):
+        fin, fout = self._get_pipe()
+        fout.write('line1\nline2\n\nline3')
+        fout.close()
+        self.assertEqual(['line1', 'line2', 'line3'], list(StdinStream(fin)))
+        fin.close()
+
+    def test_gen_stdin_delimiter(self):
+        fin, fout = self._get_pipe()
+        fout.write('v1;v2;v3\n')
+        fout.close()
+        self.assertEqual(['v1', 'v2', 'v3'], list(StdinStream(fin, ';')))
+        fin.close()
+
+    def test_gen_stdin_before_eof(self):
+        fin, fout = self._get_pipe()
+        fout.write('line1\nline2')
+        fout.flush()
+        values = iter(StdinStream(fin))
+        self.assertEqual('line1', next(values))
+        fout.write('\n')
+        fout.close()
+        self.assertEqual(['line2'], list(values))
+        fin.close()
 
     # Generator: Glob
 
@@ -1,93 +1,108 @@
 import os
 import brun
 import unittest
-import networkx as nx
 
-from brun.lib import _complete_graph
+from brun.lib import _FieldGraph, _solve_graph
 from brun.exceptions import InvalidConfigurationError
 
 SHOW_GRAPH = False
 
 
 class TestConfig(unittest.TestCase):
-    def _test(self, G):
-        _complete_graph(G)
+    def _test(self, G, path=None):
+        solved = _solve_graph(G)
         _render_graph(G)
+        if path is not None:
+            self.assertEqual(path, solved)
+        # consecutive fields of the path are grouped
+        for u, v in zip(solved, solved[1:]):
+            self.assertIsNotNone(G.get_edge_data(u, v))
 
     def test_empty_graph(self):
-        G = nx.Graph()
-        self._test(G)
+        G = _FieldGraph()
+        self._test(G, [])
 
     def test_1node_graph(self):
-        G = nx.Graph()
+        G = _FieldGraph()
         G.add_node('n1')
-        self._test(G)
+        self._test(G, ['n1'])
 
     def test_2nodes_nogroup_graph(self):
-        G = nx.Graph()
+        G = _FieldGraph()
         G.add_nodes_from(['n1', 'n2'])
-        self._test(G)
+        self._test(G, ['n1', 'n2'])
+        self.assertEqual('cross', G.get_edge_data('n1', 'n2')['type'])
 
     def test_2nodes_1group_graph(self):
-        G = nx.Graph()
+        G = _FieldGraph()
         G.add_nodes_from(['n1', 'n2'])
         G.add_edge('n1', 'n2', type='zip')
-        self._test(G)
+        self._test(G, ['n1', 'n2'])
 
     def test_3nodes_2groups_graph(self):
-        G = nx.Graph()
+        G = _FieldGraph()
         G.add_nodes_from(['n1', 'n2', 'n3'])
         G.add_edge('n1', 'n2', type='zip')
         G.add_edge('n2', 'n3', type='zip')
-        self._test(G)
+        self._test(G, ['n1', 'n2', 'n3'])
 
     def test_3nodes_2groups_undirected_graph(self):
-        G = nx.Graph()
+        G = _FieldGraph()
         G.add_nodes_from(['n1', 'n2', 'n3'])
         G.add_edge('n1', 'n2', type='zip')
         G.add_edge('n1', 'n3', type='zip')
-        self._test(G)
+        self._test(G, ['n2', 'n1', 'n3'])
 
     def test_3nodes_loop_graph(self):
-        G = nx.Graph()
+        G = _FieldGraph()
         G.add_nodes_from(['n1', 'n2', 'n3', 'n4'])
         G.add_edge('n1', 'n2', type='zip')
         G.add_edge('n2', 'n3', type='zip')
         G.add_edge('n3', 'n1', type='zipl')
-        try:
+        with self.assertRaises(InvalidConfigurationError) as e:
             self._test(G)
-        except InvalidConfigurationError as e:
-            self.assertEqual({'n1', 'n2', 'n3'}, e.data)
+        self.assertEqual({'n1', 'n2', 'n3'}, e.exception.data)
 
     def test_4nodes_2groups_graph(self):
-        G = nx.Graph()
+        G = _FieldGraph()
         G.add_nodes_from(['n1', 'n2', 'n3', 'n4'])
         G.add_edge('n1', 'n2', type='zip')
         G.add_edge('n3', 'n4', type='zip')
-        self._test(G)
+        self._test(G, ['n1', 'n2', 'n3', 'n4'])
+        # the groups are kept, they are joined by the default combinator
+        self.assertEqual('zip', G.get_edge_data('n3', 'n4')['type'])
+        self.assertEqual('cross', G.get_edge_data('n2', 'n3')['type'])
 
     def test_4nodes_fork_graph(self):
-        G = nx.Graph()
+        G = _FieldGraph()
         G.add_nodes_from(['n1', 'n2', 'n3', 'n4'])
         G.add_edge('n2', 'n1', type='zip')
         G.add_edge('n2', 'n3', type='zip')
         G.add_edge('n2', 'n4', type='zip')
-        try:
+        with self.assertRaises(InvalidConfigurationError) as e:
             self._test(G)
-        except InvalidConfigurationError as e:
-            self.assertEqual({'n1', 'n2', 'n3', 'n4'}, e.data)
+        self.assertEqual({'n1', 'n2', 'n3', 'n4'}, e.exception.data)
+
+    def test_3groups_graph(self):
+        G = _FieldGraph()
+        G.add_nodes_from(['n1', 'n2', 'n3', 'n4', 'n5', 'n6'])
+        G.add_edge('n1', 'n2', type='zip')
+        G.add_edge('n4', 'n3', type='zip')
+        G.add_edge('n5', 'n6', type='zip')
+        self._test(G, ['n1', 'n2', 'n3', 'n4', 'n5', 'n6'])
+        # the group in the middle is not replaced by the default combinator
+        self.assertEqual('zip', G.get_edge_data('n3', 'n4')['type'])
 
     def test_6nodes_2components_1fork_graph(self):
-        G = nx.Graph()
+        G = _FieldGraph()
         G.add_nodes_from(['n1', 'n2', 'n3', 'n4', 'n5', 'n6'])
         G.add_edge('n2', 'n3', type='zip')
         G.add_edge('n2', 'n4', type='zip')
         G.add_edge('n2', 'n5', type='zip')
         G.add_edge('n1', 'n6', type='zip')
-        try:
+        with self.assertRaises(InvalidConfigurationError) as e:
             self._test(G)
-        except InvalidConfigurationError as e:
-            self.assertEqual({'n2', 'n3', 'n4', 'n5'}, e.data)
+        self.assertEqual({'n2', 'n3', 'n4', 'n5'}, e.exception.data)
 
 
 def _render_graph(G):
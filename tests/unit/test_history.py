@@ -0,0 +1,41 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from brun.utils import RuntimeHistory
+
+
+class TestHistory(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'history.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_history(self):
+        history = RuntimeHistory(self.path, 'sleep {x}', alpha=0.5)
+        self.assertIsNone(history.predict({'x': 1}))
+        history.record({'x': 1}, 2.0)
+        history.record({'x': 1}, 4.0)
+        self.assertEqual(3.0, history.predict({'x': 1}))
+        history.save()
+        # templates are independent of each other
+        self.assertIsNone(RuntimeHistory(self.path, 'echo {x}').predict({'x': 1}))
+        self.assertEqual(3.0, RuntimeHistory(self.path, 'sleep {x}').predict({'x': 1}))
+
+    def test_order(self):
+        history = RuntimeHistory(self.path, 'sleep {x}')
+        for x, duration in [(1, 1.0), (2, 5.0), (3, 3.0), (4, 2.0)]:
+            history.record({'x': x}, duration)
+        history.save()
+        history = RuntimeHistory(self.path, 'sleep {x}')
+        values = lambda x: {'x': x}
+        # unknown combinations are expected to take the median duration
+        self.assertEqual([2, 3, 5, 4, 1], list(history.order([1, 2, 3, 4, 5], values)))
+        self.assertEqual([2, 1, 3, 4, 5], list(history.order([1, 2, 3, 4, 5], values, 2)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from brun.utils import Journal
+
+
+class TestJournal(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'journal')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_identity(self):
+        self.assertEqual(Journal.identity({
+            'x': 1,
+            'y': 'a'
+        }), Journal.identity({
+            'y': 'a',
+            'x': 1
+        }))
+        self.assertNotEqual(Journal.identity({'x': 1}), Journal.identity({'x': 2}))
+
+    def test_journal(self):
+        journal = Journal(self.path)
+        journal.record('a', 0)
+        journal.record('b', 1)
+        journal.record('c', 0)
+        journal.close()
+        self.assertEqual({'a', 'c'}, Journal.load(self.path))
+        # a failed combination that succeeds later
+        journal = Journal(self.path)
+        journal.record('b', 0)
+        journal.close()
+        self.assertEqual({'a', 'b', 'c'}, Journal.load(self.path))
+
+    def test_journal_truncated(self):
+        journal = Journal(self.path)
+        journal.record('a', 0)
+        journal.close()
+        with open(self.path, 'at') as fout:
+            fout.write('{"id": "b", "retu')
+        self.assertEqual({'a'}, Journal.load(self.path))
+        journal = Journal(self.path)
+        journal.record('c', 0)
+        journal.close()
+        self.assertEqual({'a', 'c'}, Journal.load(self.path))
+
+
+if __name__ == '__main__':
+    unittest.main()
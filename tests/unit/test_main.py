@@ -0,0 +1,95 @@
+import os
+import re
+import sys
+import time
+import signal
+import unittest
+import subprocess
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', '..'))
+BRUN = os.path.join(ROOT_DIR, 'brun', 'brun')
+
+
+class TestMain(unittest.TestCase):
+    def _brun(self, args, stdin=subprocess.DEVNULL, input=None, timeout=20):
+        env = dict(os.environ, PYTHONPATH=ROOT_DIR)
+        return subprocess.run([sys.executable, BRUN, '--no-status'] + args,
+                              stdin=stdin if input is None else None,
+                              input=input,
+                              stdout=subprocess.PIPE,
+                              stderr=subprocess.PIPE,
+                              env=env,
+                              timeout=timeout,
+                              universal_newlines=True)
+
+    def test_stdin_not_inherited(self):
+        # stdin stays open, a command reading it would block forever
+        read, write = os.pipe()
+        try:
+            for backend in [['--backend', 'threads'], ['--backend', 'asyncio'], ['--coprocess']]:
+                with self.subTest(backend=backend):
+                    result = self._brun(backend + ['-f', 'x:list:1', '--', 'cat'], stdin=read)
+                    self.assertEqual(0, result.returncode)
+        finally:
+            os.close(read)
+            os.close(write)
+
+    def test_stdin_field(self):
+        # the records of the field are not read by the commands
+        records = ''.join(['{}\n'.format(i) for i in range(1, 21)])
+        result = self._brun(['-f', 'x:stdin', '--', 'read l; echo {x} stole=$l'], input=records)
+        self.assertEqual(0, result.returncode)
+        lines = [l for l in result.stdout.splitlines() if l.endswith('stole=')]
+        self.assertEqual(['{} stole='.format(i) for i in range(1, 21)], lines)
+
+    def test_invalid_command(self):
+        for backend in ['threads', 'asyncio']:
+            with self.subTest(backend=backend):
+                result = self._brun(['--backend', backend, '-f', 'x:list:1,2', '--', 'echo {y}'])
+                self.assertNotEqual(0, result.returncode)
+                self.assertIn("field 'y' that was not declared", result.stderr + result.stdout)
+
+    def test_stream_order(self):
+        # the lines of the tasks are printed while they run, in the order they are written
+        cmd = 'if [ {x} = 1 ]; then echo a1; sleep 0.6; echo b1; else sleep 0.3; echo a2; fi'
+        args = ['-P', '2', '--stream', '--stream-prefix', '[{x}] ', '-f', 'x:list:1,2', '--']
+        result = self._brun(args + [cmd])
+        self.assertEqual(0, result.returncode)
+        lines = [l for l in result.stdout.splitlines() if l.startswith('[')]
+        self.assertEqual(['[1] a1', '[2] a2', '[1] b1'], lines)
+
+    def test_stream_sequential(self):
+        cmd = 'echo a{x}; echo b{x}; echo c{x}'
+        args = ['--stream', '--stream-prefix', '{x}: ', '-f', 'x:list:1,2', '--']
+        result = self._brun(args + [cmd])
+        lines = [l for l in result.stdout.splitlines() if l[:1] in '12' and l[1:2] == ':']
+        self.assertEqual(['1: a1', '1: b1', '1: c1', '2: a2', '2: b2', '2: c2'], lines)
+
+    def test_no_shell(self):
+        # each token is one argument, values with spaces are not split, nothing is expanded
+        args = ['--no-shell', '-f', 'x:list:a b,c', '--']
+        result = self._brun(args + ['printf', '%s|', '{x}', 'pre-{x}', '$HOME', ';', "it's"])
+        self.assertEqual(0, result.returncode)
+        lines = [l for l in result.stdout.splitlines() if l.endswith('|')]
+        self.assertEqual(["a b|pre-a b|$HOME|;|it's|", "c|pre-c|$HOME|;|it's|"], lines)
+
+    def test_abort(self):
+        # the combinations that are not generated yet are counted, not walked
+        env = dict(os.environ, PYTHONPATH=ROOT_DIR)
+        args = ['-P', '2', '-f', 'x:range:2000', '-f', 'y:range:2000', '--', 'sleep 1']
+        process = subprocess.Popen([sys.executable, BRUN, '--no-status'] + args,
+                                   stdout=subprocess.PIPE,
+                                   stderr=subprocess.STDOUT,
+                                   env=env,
+                                   universal_newlines=True)
+        time.sleep(0.5)
+        process.send_signal(signal.SIGINT)
+        output, _ = process.communicate(timeout=10)
+        lines = [l for l in output.splitlines() if 'Aborted' in l]
+        self.assertEqual(1, len(lines))
+        aborted = int(re.search(r'(\d+) tasks', lines[0]).group(1))
+        self.assertGreaterEqual(aborted, 2000 * 2000 - 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
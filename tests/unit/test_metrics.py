@@ -0,0 +1,52 @@
+import os
+import socket
+import shutil
+import tempfile
+import unittest
+
+from brun.utils.metrics import MetricsServer
+from brun.utils.pool import StatisticsCollector
+
+
+class TestMetrics(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _get(self, path, url):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(path)
+        sock.sendall('GET {} HTTP/1.0\r\n\r\n'.format(url).encode('utf-8'))
+        response = b''.join(iter(lambda: sock.recv(4096), b''))
+        sock.close()
+        return response.decode('utf-8')
+
+    def test_metrics(self):
+        stats = StatisticsCollector()
+        stats.set('tasks_total', 3)
+        stats.increase('tasks_completed')
+        stats.task_done(2)
+        collect = lambda: (dict(stats.get_stats(), eta=None), stats.get_histogram())
+        path = os.path.join(self.directory, 'metrics.sock')
+        server = MetricsServer('unix:' + path, collect)
+        server.start()
+        try:
+            response = self._get(path, '/metrics')
+            self.assertIn('HTTP/1.0 200', response)
+            lines = response.split('\r\n\r\n', 1)[1].splitlines()
+            self.assertIn('brun_tasks 3', lines)
+            self.assertIn('brun_tasks_completed_total 1', lines)
+            self.assertIn('brun_tasks_failed_total 0', lines)
+            self.assertIn('brun_task_duration_seconds_bucket{le="1"} 0', lines)
+            self.assertIn('brun_task_duration_seconds_bucket{le="5"} 1', lines)
+            self.assertIn('brun_task_duration_seconds_count 1', lines)
+            self.assertFalse([l for l in lines if l.startswith('brun_eta_seconds')])
+            self.assertIn('HTTP/1.0 404', self._get(path, '/'))
+        finally:
+            server.stop()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,141 @@
+import time
+import itertools
+import unittest
+
+from threading import Semaphore, Thread
+
+from brun.utils import Pool
+from brun.utils.pool import StatisticsCollector
+from brun.exceptions import TaskFailureError
+
+
+def _task(cmd, duration=0):
+    time.sleep(duration)
+    return cmd
+
+
+def _failing_task(cmd):
+    raise TaskFailureError('The command {} failed.'.format(cmd), cmd)
+
+
+class TestPool(unittest.TestCase):
+    def _get_pool(self, thread_count, queue_size=0):
+        self.errors = []
+        handler = lambda *args: self.errors.append(args)
+        return Pool(thread_count, handler, queue_size)
+
+    def test_dispatch(self):
+        pool = self._get_pool(4, 2)
+        pool.run()
+        pool.dispatch((_task, (['echo', str(i)], ), {}) for i in range(100))
+        self.assertTrue(pool.wait(5))
+        self.assertFalse(pool.alive())
+        self.assertEqual(100, len(pool.results()))
+        self.assertEqual(100, pool.get_stats()['tasks_completed'])
+
+    def test_dispatch_empty(self):
+        pool = self._get_pool(0)
+        pool.run()
+        pool.dispatch([])
+        self.assertTrue(pool.wait(5))
+
+    def test_failure(self):
+        pool = self._get_pool(2)
+        pool.run()
+        pool.dispatch((_failing_task, (['false'], ), {}) for _ in range(3))
+        self.assertTrue(pool.wait(5))
+        self.assertEqual(3, pool.get_stats()['tasks_failed'])
+        self.assertEqual(3, len(self.errors))
+
+    def test_dispatch_error(self):
+        def _tasks():
+            yield _task, (['echo'], ), {}
+            raise ValueError('Invalid command')
+
+        pool = self._get_pool(2)
+        pool.run()
+        pool.dispatch(_tasks())
+        self.assertTrue(pool.wait(5))
+        self.assertIsInstance(pool.error, ValueError)
+
+    def test_abort(self):
+        pool = self._get_pool(1, 2)
+        pool.run()
+        generated = itertools.count()
+        pool.dispatch((_task, (['sleep'], 0.2), {}) for _ in generated)
+        time.sleep(0.1)
+        pool.abort()
+        self.assertTrue(pool.wait(5))
+        stats = pool.get_stats()
+        # the generator is not consumed after the abort, the tasks taken from it are counted
+        self.assertEqual(next(generated), stats['tasks_completed'] + stats['tasks_aborted'])
+
+    def test_wakeup_latency(self):
+        pool = self._get_pool(1)
+        pool.run()
+        start = time.time()
+        pool.dispatch((_task, (['echo'], ), {}) for _ in range(10))
+        self.assertTrue(pool.wait(5))
+        self.assertLess(time.time() - start, 0.2)
+
+    def test_resize(self):
+        pool = self._get_pool(4)
+        lock = Semaphore(1)
+        running = {'now': 0, 'max': 0}
+
+        def _counting_task(cmd):
+            with lock:
+                running['now'] += 1
+                running['max'] = max(running['max'], running['now'])
+            time.sleep(0.01)
+            with lock:
+                running['now'] -= 1
+
+        pool.resize(1)
+        pool.run()
+        pool.dispatch((_counting_task, (['echo'], ), {}) for _ in range(20))
+        self.assertTrue(pool.wait(5))
+        self.assertEqual(1, running['max'])
+        self.assertEqual(20, pool.get_stats()['tasks_completed'])
+
+    def test_rates(self):
+        stats = StatisticsCollector(window=10)
+        stats.started -= 10
+        for i in range(100):
+            stats.task_done(0.01 * (i + 1))
+        rates = stats.get_stats()
+        self.assertAlmostEqual(10.0, rates['tasks_rate'], delta=0.1)
+        self.assertAlmostEqual(0.505, rates['task_duration_mean'])
+        self.assertAlmostEqual(0.95, rates['task_duration_p95'])
+        # tasks completed before the window are not counted
+        stats.tasks.appendleft((time.time() - 20, 100))
+        self.assertAlmostEqual(0.505, stats.get_stats()['task_duration_mean'])
+
+    def test_stats_shards(self):
+        stats = StatisticsCollector()
+        stats.set('tasks_total', 10)
+
+        def _increase():
+            for _ in range(1000):
+                stats.increase('tasks_completed')
+                stats.increase('tasks_total')
+                stats.task_done(0.2)
+
+        threads = [Thread(target=_increase) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(8000, stats.get_stats()['tasks_completed'])
+        self.assertEqual(8010, stats.get_stats()['tasks_total'])
+        stats.set('tasks_total', 5)
+        self.assertEqual(5, stats.get_stats()['tasks_total'])
+        histogram, total = stats.get_histogram()
+        self.assertEqual((0.1, 0), histogram[0])
+        self.assertEqual((0.5, 8000), histogram[1])
+        self.assertEqual((float('inf'), 8000), histogram[-1])
+        self.assertAlmostEqual(1600, total)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from threading import Thread
+
+from brun.agent import Agent
+from brun.utils import RemotePool
+from brun.exceptions import TaskFailureError
+
+
+def _task(cmd, reply):
+    if reply['returncode'] != 0:
+        raise TaskFailureError('The command {} failed.'.format(cmd), reply)
+    return reply
+
+
+class TestRemote(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addresses = []
+        for i, slots in enumerate([2, 3]):
+            address = 'unix:' + os.path.join(self.directory, 'agent{}.sock'.format(i))
+            agent = Agent(address, slots, 'secret')
+            Thread(target=agent.serve_forever, daemon=True).start()
+            self.addresses.append(address)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _get_pool(self, token='secret'):
+        self.errors = []
+        handler = lambda *args: self.errors.append(args)
+        return RemotePool(self.addresses, handler, token)
+
+    def test_dispatch(self):
+        pool = self._get_pool()
+        self.assertEqual(5, pool.slot_count)
+        pool.run()
+        pool.dispatch((_task, (['echo', str(i)], ), {}) for i in range(20))
+        self.assertTrue(pool.wait(10))
+        results = pool.results()
+        self.assertEqual([str(i) for i in range(20)],
+                         sorted([r['stdout'].strip() for r in results], key=int))
+        self.assertEqual(20, pool.get_stats()['tasks_completed'])
+
+    def test_failure(self):
+        pool = self._get_pool()
+        pool.run()
+        pool.dispatch((_task, (['exit', '3'], ), {}) for _ in range(3))
+        self.assertTrue(pool.wait(10))
+        self.assertEqual(3, pool.get_stats()['tasks_failed'])
+        self.assertEqual(3, len(self.errors))
+        self.assertEqual([3, 3, 3], [r['returncode'] for r in pool.results()])
+
+    def test_invalid_token(self):
+        with self.assertRaises(ValueError):
+            self._get_pool('guess')
+        # the agents keep serving the coordinators with the token
+        pool = self._get_pool()
+        pool.run()
+        pool.dispatch((_task, (['echo', str(i)], ), {}) for i in range(5))
+        self.assertTrue(pool.wait(10))
+        self.assertEqual(5, pool.get_stats()['tasks_completed'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+import os
+import csv
+import json
+import shutil
+import tempfile
+import unittest
+
+from brun.utils import TaskReport
+
+
+class TestReport(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _write(self, report):
+        for i in range(1, 21):
+            usage = dict(wall=i,
+                         user=i / 2,
+                         sys=0,
+                         maxrss=1024 * i,
+                         inblock=0,
+                         oublock=0,
+                         nvcsw=1,
+                         nivcsw=1)
+            report.write({'x': i}, 'echo {}'.format(i), 0, usage)
+        report.write({'x': 0}, 'echo 0', 127, None)
+        # less memory than brun
+        usage = dict(wall=1, user=0, sys=0, maxrss=None, inblock=0, oublock=0, nvcsw=1, nivcsw=1)
+        report.write({'x': 21}, 'echo 21', 0, usage)
+        report.close()
+
+    def test_report_csv(self):
+        report = TaskReport(os.path.join(self.directory, 'report.csv'), ['x'])
+        self._write(report)
+        with open(report.path, 'rt') as fin:
+            rows = list(csv.DictReader(fin))
+        self.assertEqual(22, len(rows))
+        self.assertEqual({
+            'x': '3',
+            'returncode': '0',
+            'wall': '3',
+            'maxrss': '3072'
+        }, {k: rows[2][k]
+            for k in ['x', 'returncode', 'wall', 'maxrss']})
+        self.assertEqual('', rows[20]['wall'])
+        self.assertEqual((10, 19, 20), report.summary()['wall'])
+        self.assertEqual((5.0, 9.5, 10.0), report.summary()['user'])
+        self.assertEqual((10240, 19456, 20480), report.summary()['maxrss'])
+        self.assertEqual(1, report.maxrss_unknown)
+
+    def test_report_json(self):
+        report = TaskReport(os.path.join(self.directory, 'report.json'), ['x'])
+        self._write(report)
+        with open(report.path, 'rt') as fin:
+            rows = [json.loads(line) for line in fin]
+        self.assertEqual(22, len(rows))
+        self.assertEqual('echo 1', rows[0]['command'])
+        self.assertIsNone(rows[20]['maxrss'])
+
+
+if __name__ == '__main__':
+    unittest.main()
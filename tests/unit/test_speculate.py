@@ -0,0 +1,68 @@
+import time
+import signal
+import unittest
+import subprocess
+
+from threading import Event
+
+from brun.utils import Speculator
+
+
+class FakeStats(object):
+    def __init__(self, median):
+        self.median = median
+        self.counters = dict()
+
+    def get_median_duration(self):
+        return self.median
+
+    def increase(self, key):
+        self.counters[key] = self.counters.get(key, 0) + 1
+
+
+class FakePool(object):
+    def __init__(self, median, idle):
+        self.stats = FakeStats(median)
+        self.idle = idle
+        self.aborted = Event()
+        self.duplicated = []
+
+    def drained(self):
+        return True
+
+    def get_stats(self):
+        return {'jobs_idle': self.idle}
+
+    def duplicate(self, func, *args, **kwargs):
+        self.duplicated.append((func, args, kwargs))
+
+
+class TestSpeculator(unittest.TestCase):
+    def test_first_copy_wins(self):
+        speculator = Speculator(FakePool(1.0, 1), 2)
+        task = subprocess.Popen('sleep 10', shell=True, start_new_session=True)
+        original = speculator.register(0, task.pid, ('f', (), {}))
+        copy = speculator.register(0, 1, ('f', (), {}), speculative=True)
+        self.assertTrue(speculator.finish(copy))
+        self.assertFalse(speculator.finish(original))
+        task.wait(5)
+        self.assertEqual(-signal.SIGKILL, task.returncode)
+        # the copies that start after the task completed are dropped
+        self.assertIsNone(speculator.register(0, 1, ('f', (), {}), speculative=True))
+
+    def test_stragglers(self):
+        pool = FakePool(0.01, 1)
+        speculator = Speculator(pool, 2, interval=0.01)
+        slow = speculator.register(0, 1, ('f', (['cmd'], 'cc'), {'timeout': None}))
+        speculator.register(1, 2, ('f', (['cmd'], 'cc'), {'timeout': None}))
+        speculator.finish(speculator.entries[1].attempts[0])
+        speculator.start()
+        time.sleep(0.2)
+        speculator.stop()
+        # a single copy of the task that is still running
+        self.assertEqual([('f', (['cmd'], 'cc'), {
+            'timeout': None,
+            'speculative': True
+        })], pool.duplicated)
+        self.assertEqual(1, pool.stats.counters['tasks_speculated'])
+        self.assertTrue(speculator.finish(slow))
@@ -0,0 +1,43 @@
+import os
+import gzip
+import shutil
+import tempfile
+import unittest
+
+from brun.utils import OutputSpool
+
+
+class TestSpool(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_spool(self):
+        spool = OutputSpool(self.directory, tail=2)
+        stdout, stderr = spool.open(7, 'echo')
+        for i in range(5):
+            stdout.write('line{}'.format(i))
+        stdout.close()
+        stderr.close()
+        spool.close()
+        with open(spool.path(7, 'stdout'), 'rt') as fin:
+            self.assertEqual(['line{}\n'.format(i) for i in range(5)], fin.readlines())
+        self.assertEqual('line3\nline4', stdout.tail())
+        self.assertFalse(os.path.exists(spool.path(7, 'stderr')))
+        with open(os.path.join(self.directory, 'index.tsv'), 'rt') as fin:
+            self.assertEqual('7\techo\n', fin.read())
+
+    def test_spool_compress(self):
+        spool = OutputSpool(self.directory, compress=True)
+        stdout, _ = spool.open(0, 'echo')
+        stdout.write('line')
+        stdout.close()
+        spool.close()
+        with gzip.open(spool.path(0, 'stdout'), 'rt') as fin:
+            self.assertEqual('line\n', fin.read())
+
+
+if __name__ == '__main__':
+    unittest.main()
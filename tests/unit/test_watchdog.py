@@ -0,0 +1,47 @@
+import time
+import signal
+import unittest
+import subprocess
+
+from brun.utils import Watchdog
+
+
+class TestWatchdog(unittest.TestCase):
+    def setUp(self):
+        self.watchdog = Watchdog(grace=0.2)
+        self.watchdog.start()
+
+    def tearDown(self):
+        self.watchdog.stop()
+
+    def _spawn(self, cmd):
+        return subprocess.Popen(cmd, shell=True, start_new_session=True)
+
+    def test_timeout(self):
+        task = self._spawn('sleep 10')
+        deadline = self.watchdog.watch(task.pid, 0.1)
+        task.wait(5)
+        self.assertTrue(deadline.timed_out)
+        self.assertEqual(-signal.SIGTERM, task.returncode)
+
+    def test_escalation(self):
+        # the shell ignores SIGTERM, so does the child it leaves behind
+        task = self._spawn("trap '' TERM; sleep 10")
+        start = time.time()
+        self.watchdog.watch(task.pid, 0.1)
+        task.wait(5)
+        self.assertEqual(-signal.SIGKILL, task.returncode)
+        self.assertGreaterEqual(time.time() - start, 0.3)
+
+    def test_cancel(self):
+        task = self._spawn('sleep 0.3')
+        deadline = self.watchdog.watch(task.pid, 0.5)
+        task.wait(5)
+        self.watchdog.cancel(deadline)
+        time.sleep(0.5)
+        self.assertFalse(deadline.timed_out)
+        self.assertEqual(0, task.returncode)
+
+
+if __name__ == '__main__':
+    unittest.main()